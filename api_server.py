@@ -0,0 +1,320 @@
+import argparse
+import ipaddress
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import anyio
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import iterate_in_threadpool
+
+import metrics
+from config import API_KEYS, API_THREADS, CONTEXT_BUDGET_TOKENS
+from chaining import run_chaining, stream_chaining, build_chain_graph, ChainError
+from firebase_auth import log_prompt_to_firebase
+from history_store import fetch_history_page, fetch_entry, PAGE_SIZE
+from prompt_engine import generate_prompt, stream_prompt
+from resilience import GenerationError, DeadlineExceeded
+from template_engine import TemplateRenderError
+from template_manager import load_templates, get_compiled_template, build_budgeted_prompt
+from token_budget import count_tokens
+
+# 🌐 Headless HTTP API over the same modules the Streamlit app uses.
+# The backends (pyrebase, LLM SDKs) are blocking, so every call runs in a worker
+# thread and the event loop only waits on it; API_THREADS caps how many run at
+# once. Upstream calls still queue in the process-wide llm_scheduler.
+# Callers pick the user_id they act for, so without API_KEYS only clients on
+# this machine are served.
+#
+#   API_KEYS=... uvicorn api_server:app --host 0.0.0.0 --port 8000
+#   python api_server.py --port 8000
+
+@asynccontextmanager
+async def lifespan(app):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREADS
+    metrics.start_exporters()
+    yield
+
+
+app = FastAPI(title="AutoPrompt Builder API", lifespan=lifespan)
+
+
+def _is_loopback(host):
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+
+def check_api_key(request: Request, x_api_key: str = Header(default="")):
+    if API_KEYS:
+        if x_api_key not in API_KEYS:
+            raise HTTPException(status_code=401, detail="Missing or invalid X-API-Key header.")
+    elif not (request.client and _is_loopback(request.client.host)):
+        # No API_KEYS configured = local development only
+        raise HTTPException(status_code=403, detail="API_KEYS is not set; only local clients are served.")
+
+
+# ─── Request bodies ─────────────────────────────
+
+class Example(BaseModel):
+    input: str
+    output: str
+
+
+class RenderRequest(BaseModel):
+    user_id: Optional[str] = None
+    role: str = ""
+    audience: str = ""
+    tone: str = "Formal"
+    intent: str = ""
+    few_shot_examples: list[Example] = []
+
+
+class GenerateRequest(BaseModel):
+    user_id: Optional[str] = None
+    email: Optional[str] = None               # stored with the log
+    prompt: Optional[str] = None              # a ready prompt, or
+    template: Optional[str] = None            # a template filled from the fields below
+    role: str = ""
+    audience: str = ""
+    tone: str = "Formal"
+    intent: str = ""
+    few_shot_examples: list[Example] = []
+    temperature: float = Field(0.7, ge=0.0, le=1.0)
+    max_tokens: int = Field(300, ge=1, le=4096)
+    use_cache: bool = True
+    log: bool = False                         # write to the user's history
+
+
+class ChainRequest(BaseModel):
+    user_id: Optional[str] = None
+    email: Optional[str] = None
+    steps: list[str]
+    initial_input: str
+    temperature: float = Field(0.7, ge=0.0, le=1.0)
+    max_tokens: int = Field(300, ge=1, le=4096)
+    use_cache: bool = True
+    log: bool = False
+
+
+# ─── Helpers ────────────────────────────────────
+
+def _error_status(e):
+    return 504 if isinstance(e, DeadlineExceeded) else 502
+
+
+def _render(user_id, name, fields):
+    try:
+        template = get_compiled_template(user_id, name)
+        if template is None:
+            raise HTTPException(status_code=404, detail=f"Unknown template '{name}'.")
+        return build_budgeted_prompt(
+            template, fields.role, fields.audience, fields.tone, fields.intent,
+            [(ex.input, ex.output) for ex in fields.few_shot_examples], budget=CONTEXT_BUDGET_TOKENS,
+        )
+    except TemplateRenderError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _prompt_for(req):
+    if req.prompt:
+        return req.prompt
+    if not req.template:
+        raise HTTPException(status_code=422, detail="Send either `prompt` or `template`.")
+    return _render(req.user_id, req.template, req)[0]
+
+
+def _log(req, prompt, response, chain_steps=None):
+    if not (req.log and req.user_id):
+        return None
+    meta = {"temperature": req.temperature, "max_tokens": req.max_tokens}
+    if chain_steps is None:
+        meta.update(role=req.role, audience=req.audience, tone=req.tone, intent=req.intent, template=req.template)
+    log_key, _ = log_prompt_to_firebase(req.email or "", prompt, response, meta, chain_steps=chain_steps, uid=req.user_id)
+    return log_key
+
+
+def _check_steps(steps):
+    # Bad step references fail here with 422, before anything is generated or streamed
+    if not steps:
+        raise HTTPException(status_code=422, detail="`steps` is empty.")
+    try:
+        build_chain_graph(steps)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# ─── Templates ──────────────────────────────────
+
+@app.get("/templates", dependencies=[Depends(check_api_key)])
+async def list_templates(user_id: Optional[str] = None):
+    templates = await anyio.to_thread.run_sync(load_templates, user_id)
+    return {name: {"structure": template.get("structure", "")} for name, template in templates.items()}
+
+
+@app.post("/templates/{name}/render", dependencies=[Depends(check_api_key)])
+async def render_template(name: str, req: RenderRequest):
+    prompt, dropped = await anyio.to_thread.run_sync(_render, req.user_id, name, req)
+    return {"prompt": prompt, "tokens": count_tokens(prompt), "dropped_examples": dropped}
+
+
+# ─── Generation ─────────────────────────────────
+
+def _generate(req):
+    prompt = _prompt_for(req)
+    start = time.perf_counter()
+    try:
+        response = generate_prompt(prompt, req.temperature, req.max_tokens, use_cache=req.use_cache,
+                                   raise_errors=True, user_id=req.user_id)
+    except GenerationError as e:
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+    latency = time.perf_counter() - start
+    return {"prompt": prompt, "response": response, "latency_ms": round(latency * 1000, 1),
+            "log_key": _log(req, prompt, response)}
+
+
+@app.post("/generate", dependencies=[Depends(check_api_key)])
+async def generate(req: GenerateRequest):
+    return await anyio.to_thread.run_sync(_generate, req)
+
+
+@app.post("/generate/stream", dependencies=[Depends(check_api_key)])
+async def generate_stream(req: GenerateRequest):
+    """Server-sent events: `token` events, then one `done` (or `error`) event."""
+    prompt = await anyio.to_thread.run_sync(_prompt_for, req)
+
+    async def events():
+        chunks = []
+        try:
+            tokens = stream_prompt(prompt, req.temperature, req.max_tokens, use_cache=req.use_cache,
+                                   raise_errors=True, user_id=req.user_id)
+            async for token in iterate_in_threadpool(tokens):
+                chunks.append(token)
+                yield _sse("token", {"text": token})
+        except GenerationError as e:
+            yield _sse("error", {"status": _error_status(e), "detail": str(e)})
+            return
+        try:
+            log_key = await anyio.to_thread.run_sync(_log, req, prompt, "".join(chunks))
+        except Exception as e:
+            yield _sse("error", {"status": 500, "detail": str(e)})
+            return
+        yield _sse("done", {"log_key": log_key})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+# ─── Chaining ───────────────────────────────────
+
+def _chain_steps(outputs):
+    return [{"step": step, "prompt": prompt, "response": output} for step, prompt, output in outputs]
+
+
+def _chain(req):
+    reused = []
+    try:
+        outputs = run_chaining(req.steps, req.initial_input, req.temperature, req.max_tokens,
+                               use_cache=req.use_cache, reused=reused, user_id=req.user_id)
+    except ChainError as e:
+        raise HTTPException(status_code=_error_status(e.cause), detail={
+            "error": str(e), "failed_step": e.step_index + 1, "completed": _chain_steps(e.outputs),
+        })
+    steps = _chain_steps(outputs)
+    return {"steps": steps, "reused": [i + 1 for i in sorted(reused)],
+            "log_key": _log(req, req.initial_input, outputs[-1][2] if outputs else "", chain_steps=steps)}
+
+
+@app.post("/chain", dependencies=[Depends(check_api_key)])
+async def chain(req: ChainRequest):
+    _check_steps(req.steps)
+    return await anyio.to_thread.run_sync(_chain, req)
+
+
+@app.post("/chain/stream", dependencies=[Depends(check_api_key)])
+async def chain_stream(req: ChainRequest):
+    """Server-sent events: per step a `step` event, its `token` events and a `step_done` event; then `done` (or `error`)."""
+    _check_steps(req.steps)
+
+    def flatten():
+        # One sync iterator over the whole chain, so it can run in the threadpool
+        reused = []
+        steps = []
+        for step, prompt, token_stream in stream_chaining(req.steps, req.initial_input, req.temperature, req.max_tokens,
+                                                          use_cache=req.use_cache, reused=reused, user_id=req.user_id):
+            yield _sse("step", {"step": step, "prompt": prompt, "reused": len(steps) in reused})
+            chunks = []
+            for token in token_stream:
+                chunks.append(token)
+                yield _sse("token", {"step": step, "text": token})
+            steps.append({"step": step, "prompt": prompt, "response": "".join(chunks)})
+            yield _sse("step_done", {"step": step})
+        log_key = _log(req, req.initial_input, steps[-1]["response"], chain_steps=steps)
+        yield _sse("done", {"log_key": log_key})
+
+    async def events():
+        try:
+            async for event in iterate_in_threadpool(flatten()):
+                yield event
+        except GenerationError as e:
+            yield _sse("error", {"status": _error_status(e), "detail": str(e)})
+        except Exception as e:
+            # The 200 and its headers are already sent, so failures can only be reported in-stream
+            yield _sse("error", {"status": 500, "detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+# ─── History ────────────────────────────────────
+
+@app.get("/history/{user_id}", dependencies=[Depends(check_api_key)])
+async def history(user_id: str, before: Optional[str] = None, limit: int = PAGE_SIZE):
+    """One page of log summaries, newest first; pass `next` back as `before`."""
+    limit = max(1, min(limit, 200))
+    entries, cursor = await anyio.to_thread.run_sync(lambda: fetch_history_page(user_id, limit, before_key=before))
+    return {"entries": [{"key": key, **summary} for key, summary in entries], "next": cursor}
+
+
+@app.get("/history/{user_id}/{key}", dependencies=[Depends(check_api_key)])
+async def history_entry(user_id: str, key: str):
+    entry = await anyio.to_thread.run_sync(fetch_entry, user_id, key)
+    if not entry:
+        raise HTTPException(status_code=404, detail="No such log entry.")
+    return entry
+
+
+# ─── Ops ────────────────────────────────────────
+
+@app.get("/healthz")
+async def healthz():
+    return {"ok": True}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return metrics.render_prometheus()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the AutoPrompt Builder HTTP API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (each has its own caches and scheduler)")
+    args = parser.parse_args()
+    if not API_KEYS and not _is_loopback(args.host):
+        parser.error(f"refusing to serve on {args.host} without API_KEYS; set API_KEYS or use a loopback host")
+
+    import uvicorn
+    uvicorn.run("api_server:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
+#api_server
@@ -1,28 +1,66 @@
-import streamlit as st
 import time
 import json
 import os
+import hashlib
 from datetime import datetime
-from template_manager import load_templates
-from prompt_engine import generate_prompt
-from chaining import run_chaining
-from firebase_auth import signup, login, log_prompt_to_firebase, db
-from firebase_auth import update_feedback_in_firebase
+from startup_timing import timed, report as startup_report
+
+# ⏱️ Import cost per module (Cohere/Firebase clients are created on first use)
+with timed("import streamlit"):
+    import streamlit as st
+with timed("import template_manager"):
+    from template_manager import load_templates, save_template, get_compiled_template, build_budgeted_prompt
+    from token_budget import count_tokens
+    from config import CONTEXT_BUDGET_TOKENS
+    from template_engine import compile_template, TemplateRenderError
+with timed("import example_library"):
+    from example_library import example_library
+    from config import EXAMPLE_TOP_K
+with timed("import prompt_engine"):
+    from prompt_engine import stream_prompt
+    from resilience import GenerationError
+    from llm_scheduler import llm_scheduler
+with timed("import metrics"):
+    import metrics
+    from config import ADMIN_EMAILS
+    metrics.start_exporters()  # no-op unless METRICS_PORT / METRICS_JSONL_PATH are set
+with timed("import batch_runner"):
+    from batch_runner import run_batch, read_rows
+    from param_sweep import sweep_variants, run_sweep
+    from config import SWEEP_MAX_VARIANTS
+with timed("import chaining"):
+    from chaining import run_chaining, stream_chaining, has_parallel_steps, ChainError
+with timed("import firebase_auth"):
+    from firebase_auth import signup, login, log_prompt_to_firebase
+    from firebase_auth import update_feedback_in_firebase
+with timed("import history_store"):
+    from history_store import (
+        new_history_view, sync_new, delete_entry, fetch_entry, open_entry,
+        page_entries, has_older_page, older_page, newer_page, set_summary_rating,
+    )
+with timed("import history_search"):
+    from history_search import history_index
+with timed("import rollups"):
+    from rollups import fetch_rollups, DIMENSIONS as ROLLUP_DIMENSIONS
+with timed("import rerun_profiler"):
+    import rerun_profiler
 
 st.set_page_config(page_title="AutoPrompt Builder")
 st.title("🧠 AutoPrompt Builder")
 
-# 🔐 Login Section
-REMEMBER_FILE = "remembered_user.txt"
+# 🐢 Per-section timing of this rerun (PROFILE_RERUNS=true or ?profile=1)
+rerun_profile = rerun_profiler.begin(st.session_state) if rerun_profiler.is_enabled(st.query_params) else None
+
+def mark_section(name):
+    if rerun_profile:
+        rerun_profile.mark(name)
 
-# Auto-login if remembered email exists
+mark_section("login")
+# 🔐 Login Section
+# The signed-in user and their tokens live only in this browser session's
+# state; no credential is written to the server's disk
 if "user" not in st.session_state:
     st.session_state.user = None
-    if os.path.exists(REMEMBER_FILE):
-        with open(REMEMBER_FILE, "r") as f:
-            remembered_email = f.read().strip()
-            if remembered_email:
-                st.session_state.user = {"email": remembered_email}
 
 # If still not logged in, show login form
 if st.session_state.user is None:
@@ -32,7 +70,6 @@ if st.session_state.user is None:
     with tab1:
         email = st.text_input("Email")
         password = st.text_input("Password", type="password")
-        remember = st.checkbox("Remember Me (for this device only)")
 
         if st.button("Login"):
             if not email or not password:
@@ -42,11 +79,6 @@ if st.session_state.user is None:
                     user = login(email, password)
                     st.session_state.user = user
                     st.success("✅ Logged in successfully!")
-
-                    if remember:
-                        with open(REMEMBER_FILE, "w") as f:
-                            f.write(email)
-
                     st.rerun()
                 except ValueError as ve:
                     st.error(str(ve))  # shows: "Wrong email or password."
@@ -71,18 +103,70 @@ if st.session_state.user is None:
                     st.error("Signup failed due to an unexpected error. Please try again.")
 
 
+    if rerun_profile:
+        rerun_profile.finish()
     st.stop()
 
 
+mark_section("sidebar")
+if rerun_profile:
+    rerun_profile.label = st.session_state.user["email"]
+
 # 🚪 Logout button (after successful login)
 st.sidebar.markdown("### 👤 Logged in as:")
 st.sidebar.code(st.session_state.user["email"])
 if st.sidebar.button("🚪 Logout"):
     st.session_state.user = None
-    if os.path.exists("remembered_user.txt"):
-        os.remove("remembered_user.txt")
+    st.session_state.pop("history_view", None)
+    st.session_state.pop("search_opened", None)
+    st.session_state.pop("history_index_synced", None)
     st.rerun()
 
+# 🔑 The Firebase uid keys every database path of this user
+user_id = st.session_state.user["uid"]
+
+with st.sidebar.expander("⏱️ Startup Timing"):
+    st.caption("Import and client initialisation cost for this server process (ms).")
+    st.table(startup_report())
+
+if st.session_state.user["email"].lower() in ADMIN_EMAILS:
+    with st.sidebar.expander("📈 Metrics (admin)"):
+        metrics_snapshot = metrics.snapshot()
+        st.caption("Latency per operation in this server process (ms, recent samples).")
+        if metrics_snapshot["ops"]:
+            st.dataframe(metrics_snapshot["ops"], hide_index=True)
+        if metrics_snapshot["counters"]:
+            st.dataframe(metrics_snapshot["counters"], hide_index=True)
+        if not metrics_snapshot["ops"] and not metrics_snapshot["counters"]:
+            st.info("Nothing recorded yet.")
+
+with st.sidebar.expander("🚦 LLM Queue"):
+    queue_stats = llm_scheduler.stats()
+    st.caption("Shared by every session on this server. Interactive prompts go before chains, chains before batches.")
+    st.table({"waiting": queue_stats["queue_depth"]})
+    if queue_stats["wait_ms"]:
+        st.table(queue_stats["wait_ms"])
+    st.caption(
+        f"Granted {queue_stats['granted']} · timed out {queue_stats['timed_out']} · "
+        f"requests left {queue_stats['requests_available'] if queue_stats['requests_available'] is not None else '∞'} · "
+        f"tokens left {queue_stats['tokens_available'] if queue_stats['tokens_available'] is not None else '∞'}"
+    )
+
+if rerun_profile:
+    with st.sidebar.expander("🐢 Slowest Reruns"):
+        slow_reruns = rerun_profiler.slowest()
+        st.caption("Recent reruns of this server process (ms per section). Slow ones are profiled to disk.")
+        if slow_reruns:
+            st.dataframe([
+                {"time": r["time"], "user": r["label"], "total_ms": r["total_ms"],
+                 **r["sections"], "profile": r["profile"] or ("(cut short by rerun)" if r["interrupted"] else "")}
+                for r in slow_reruns
+            ], hide_index=True)
+        else:
+            st.info("No finished reruns yet.")
+
+mark_section("builder")
+
 # ✅ Setup clear_prompt flag for reset logic
 if "clear_chaining" not in st.session_state:
     st.session_state.clear_chaining = False
@@ -96,7 +180,6 @@ if "last_response" not in st.session_state:
 if "full_prompt" not in st.session_state:
     st.session_state["full_prompt"] = ""
 with st.expander("🧠 AutoPrompt Builder", expanded=False):
-    user_id = st.session_state.user.get("uid") or st.session_state.user["email"].replace(".", "_")
     templates = load_templates(user_id)
     template_choice = st.selectbox("Choose Industry Template", list(templates.keys()))
     template = templates[template_choice]
@@ -106,6 +189,14 @@ with st.expander("🧠 AutoPrompt Builder", expanded=False):
 
         st.markdown("✍️ Customize Template")
         edited_template = st.text_area("Edit Template Format", value=template.get("structure", ""), height=120)
+        try:
+            # Compiled once here (and cached by structure); the builders below render this plan
+            compiled_template = compile_template(edited_template)
+            placeholders = compiled_template.placeholders
+            st.caption("Placeholders: " + (", ".join(f"`{{{name}}}`" for name in placeholders) or "none"))
+        except TemplateRenderError as e:
+            compiled_template = edited_template  # rendering reports the same error
+            st.warning(f"⚠️ {e}")
 
         new_template_name = st.text_input("📁 Save As New Template Name (without .json)")
 
@@ -114,9 +205,8 @@ with st.expander("🧠 AutoPrompt Builder", expanded=False):
                 st.warning("Please enter a name for the new template.")
             else:
                 new_template_data = {"structure": edited_template}
-                user_id = st.session_state.user.get("uid") or st.session_state.user["email"].replace(".", "_")
                 try:
-                    db.child("templates").child(user_id).child(new_template_name.strip()).set(new_template_data)
+                    save_template(user_id, new_template_name.strip(), new_template_data)
                     st.success(f"Template saved as '{new_template_name.strip()}' in Firebase.")
                 except Exception as e:
                     st.error(f"Failed to save template: {e}")
@@ -152,6 +242,7 @@ with st.expander("🧠 AutoPrompt Builder", expanded=False):
 
     # Few-Shot Examples
     st.markdown("### 🧠 Optional: Few-Shot Examples")
+    example_library.prefetch(user_id, template_choice)   # 📚 download the saved examples while the form is filled in
     if "example_count" not in st.session_state:
         st.session_state["example_count"] = 0
     example_count = st.number_input(
@@ -167,50 +258,146 @@ with st.expander("🧠 AutoPrompt Builder", expanded=False):
         if input_example and output_example:
             few_shot_examples.append((input_example, output_example))
 
+    # 📚 Saved examples closest to the intent go after the ones typed above
+    if few_shot_examples and st.button("💾 Save these examples to my library", key="save_examples_button"):
+        for input_example, output_example in few_shot_examples:
+            example_library.add(user_id, template_choice, input_example, output_example)
+        st.success(f"Saved {len(few_shot_examples)} example(s) for '{template_choice}'.")
+
+    if st.checkbox("📚 Add the most relevant examples from my library", key="use_example_library"):
+        library_k = st.slider("Library examples to add", 1, 5, EXAMPLE_TOP_K, key="example_library_k")
+        try:
+            saved_count = example_library.count(user_id, template_choice)
+            retrieved = []
+            if intent:
+                typed = set(few_shot_examples)
+                candidates = example_library.retrieve(user_id, template_choice, intent, library_k + len(typed))
+                retrieved = [(i, o) for i, o, _ in candidates if (i, o) not in typed][:library_k]
+            st.caption(f"{saved_count} saved for '{template_choice}' · adding {len(retrieved)} closest to the intent")
+            for input_example, _ in retrieved:
+                st.caption(f"• {input_example[:100]}")
+            few_shot_examples += retrieved
+        except Exception as e:
+            st.error(f"Failed to load the example library: {e}")
+
     # Parameter Tuning
     st.markdown("### ⚙️ Parameter Tuning")
     temperature = st.slider("Temperature (Controls creativity)", min_value=0.0, max_value=1.0, value=0.7, step=0.05)
     max_tokens = st.number_input("Max Tokens (Controls output length)", min_value=10, max_value=1000, value=300)
+    fresh_response = st.checkbox("🔄 Skip cache (always ask the model again)", key="prompt_skip_cache")
+
+    # 🧪 Sweep: the same inputs over a grid of settings, generated in parallel
+    if st.checkbox("🧪 Sweep mode (compare several settings side by side)", key="sweep_mode"):
+        sweep_templates = st.multiselect("Templates", list(templates.keys()), default=[template_choice], key="sweep_templates")
+        sweep_temperatures = st.multiselect("Temperatures", [0.0, 0.2, 0.4, 0.6, 0.7, 0.8, 1.0], default=[0.2, 0.7, 1.0], key="sweep_temperatures")
+        sweep_max_tokens = st.multiselect("Max Tokens", [100, 200, 300, 500, 800, 1000], default=[300], key="sweep_max_tokens")
+        variants = sweep_variants(sweep_templates, sweep_temperatures, sweep_max_tokens)
+        st.caption(f"{len(variants)} variant(s)")
+
+        def render_sweep_cell(result):
+            st.markdown(f"**{result['template']}** · 🌡️ {result['temperature']} · 📏 {result['max_tokens']}")
+            if result["status"] == "ok":
+                st.caption(f"⏱️ {result['latency_ms']} ms · 🔢 {result['prompt_tokens']} → {result['response_tokens']} tokens")
+                st.write(result["response"])
+            else:
+                st.error(result["error"])
+
+        if st.button("🧪 Run Sweep", key="run_sweep_button"):
+            if not role or not audience or not intent:
+                st.warning("⚠️ Please fill in all fields: Role, Audience, and Intent are required.")
+            elif not variants:
+                st.warning("⚠️ Pick at least one template, temperature and max tokens value.")
+            elif len(variants) > SWEEP_MAX_VARIANTS:
+                st.warning(f"⚠️ {len(variants)} variants is more than the limit of {SWEEP_MAX_VARIANTS}.")
+            else:
+                # The selected template runs with the edits made above
+                sweep_compiled = {}
+                for name in sweep_templates:
+                    try:
+                        sweep_compiled[name] = get_compiled_template(user_id, name)
+                    except TemplateRenderError:
+                        sweep_compiled[name] = templates[name].get("structure", "")  # its variants report the error
+                sweep_compiled[template_choice] = compiled_template
+                sweep_progress = st.progress(0.0, text="Starting sweep...")
+                columns = st.columns(min(3, len(variants)))
+                cells = [columns[i % len(columns)].empty() for i in range(len(variants))]
+
+                def show_sweep_result(result, done, total):
+                    sweep_progress.progress(done / total, text=f"{done}/{total} variants finished")
+                    with cells[result["variant"]].container():
+                        render_sweep_cell(result)
+
+                sweep_id, sweep_results = run_sweep(
+                    sweep_compiled, variants, role, audience, tone, intent, few_shot_examples,
+                    use_cache=not fresh_response, on_result=show_sweep_result,
+                    user_id=user_id, email=st.session_state.user["email"]
+                )
+                st.session_state["sweep_results"] = (sweep_id, sweep_results)
+                st.rerun()
+
+        if st.session_state.get("sweep_results"):
+            sweep_id, sweep_results = st.session_state["sweep_results"]
+            st.caption(f"Sweep `{sweep_id}` · logged to your history")
+            columns = st.columns(min(3, len(sweep_results)))
+            for i, result in enumerate(sweep_results):
+                with columns[i % len(columns)]:
+                    render_sweep_cell(result)
 
     if st.button("Generate Prompt"):
         if not role or not audience or not intent:
             st.warning("⚠️ Please fill in all fields: Role, Audience, and Intent are required.")
         else:
-            base_prompt = edited_template.format(role=role, audience=audience, tone=tone, intent=intent)
-
-            few_shot_prompt = ""
-            for idx, (ex_input, ex_output) in enumerate(few_shot_examples):
-                few_shot_prompt += f"Example {idx+1}:\nInput: {ex_input}\nOutput: {ex_output}\n\n"
-
-            full_prompt = few_shot_prompt + "Now complete the task:\n" + base_prompt
-
-            result = generate_prompt(full_prompt, temperature=temperature, max_tokens=max_tokens)
-
-            # Save to session
-            st.session_state["full_prompt"] = full_prompt
-            st.session_state["last_response"] = result
-
-            # Log to Firebase
-            log_key,log_timestamp=log_prompt_to_firebase(
-                email=st.session_state.user["email"],
-                prompt=full_prompt,
-                response=result,
-                meta={
-                    "role": role,
-                    "audience": audience,
-                    "tone": tone,
-                    "intent": intent,
-                    "temperature": temperature,
-                    "max_tokens": max_tokens,
-                    "rating": None,
-                    "feedback": None,
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                },
-                uid = st.session_state.user["email"].replace(".", "_")
+            # ⚡ Show tokens as they arrive, then keep the assembled text
+            live_response = st.empty()
+            try:
+                full_prompt, dropped_examples = build_budgeted_prompt(compiled_template, role, audience, tone, intent, few_shot_examples)
+                prompt_tokens = count_tokens(full_prompt)
+                if dropped_examples:
+                    st.warning(f"✂️ Dropped the last {dropped_examples} few-shot example(s) to stay within the {CONTEXT_BUDGET_TOKENS}-token context budget.")
+                elif prompt_tokens > CONTEXT_BUDGET_TOKENS:
+                    st.warning(f"⚠️ The prompt is ~{prompt_tokens} tokens, over the {CONTEXT_BUDGET_TOKENS}-token budget.")
+                st.caption(f"📏 Prompt size: ~{prompt_tokens} tokens")
+                with live_response.container():
+                    st.subheader("🧠 AI Response:")
+                    result = st.write_stream(
+                        stream_prompt(full_prompt, temperature=temperature, max_tokens=max_tokens,
+                                      use_cache=not fresh_response, raise_errors=True, user_id=user_id)
+                    )
+            except TemplateRenderError as e:
+                result = None
+                st.error(f"❌ Template error: {e}")
+            except GenerationError as e:
+                result = None
+                st.error(f"❌ Generation failed after {e.attempts} attempt(s): {e}")
+            live_response.empty()
+
+            if result is not None:
+                # Save to session
+                st.session_state["full_prompt"] = full_prompt
+                st.session_state["last_response"] = result
+
+                # Log to Firebase
+                log_key,log_timestamp=log_prompt_to_firebase(
+                    email=st.session_state.user["email"],
+                    prompt=full_prompt,
+                    response=result,
+                    meta={
+                        "role": role,
+                        "audience": audience,
+                        "tone": tone,
+                        "intent": intent,
+                        "temperature": temperature,
+                        "max_tokens": max_tokens,
+                        "template": template_choice,
+                        "rating": None,
+                        "feedback": None,
+                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    },
+                    uid=user_id
 
-            )
-            st.session_state["prompt_log_key"] = log_key
-            st.session_state["prompt_log_uid"] = st.session_state.user.get("uid") or st.session_state.user["email"].replace(".", "_")
+                )
+                st.session_state["prompt_log_key"] = log_key
+                st.session_state["prompt_log_uid"] = user_id
 
     # Show AI Response
     if st.session_state.get("last_response"):
@@ -269,6 +456,8 @@ Intent: {intent}
             rating=rating,
             feedback=feedback
         )
+                if "history_view" in st.session_state:
+                    set_summary_rating(st.session_state.history_view, st.session_state["prompt_log_key"], rating)
             else:
                 st.warning("⚠️ Could not update feedback: log key missing.")
 
@@ -276,7 +465,63 @@ Intent: {intent}
     if st.button("🧹 Clear Prompt Input & Output"):
         st.session_state.clear_prompt = True
         st.rerun()
+# 📦 Batch generation section
+mark_section("batch")
+BATCH_DIR = "batch_jobs"
+
+st.markdown("---")
+st.title("📦 Batch Generation")
+
+with st.expander("📦 Batch Generation", expanded=False):
+    st.markdown("Upload a CSV or JSONL file. Each row's columns fill the template placeholders (e.g. `role`, `audience`, `tone`, `intent`).")
+    batch_template = st.selectbox("Template", list(templates.keys()), key="batch_template")
+    uploaded_rows = st.file_uploader("Rows file", type=["csv", "jsonl"], key="batch_upload")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        batch_temperature = st.slider("Temperature", 0.0, 1.0, 0.7, step=0.05, key="batch_temp")
+    with col2:
+        batch_max_tokens = st.number_input("Max Tokens", 10, 2048, 300, key="batch_tokens")
+    with col3:
+        batch_workers = st.number_input("Parallel Workers", 1, 16, 4, key="batch_workers")
+    batch_rpm = st.number_input("Max Requests per Minute (0 = unlimited)", 0, 1000, 60, key="batch_rpm")
+
+    if uploaded_rows is not None and st.button("▶️ Run Batch", key="run_batch_button"):
+        os.makedirs(BATCH_DIR, exist_ok=True)
+        raw_rows = uploaded_rows.getvalue()
+        structure = templates[batch_template].get("structure", "")
+
+        # Same file + same template = same job, so a rerun resumes where it stopped
+        job_id = hashlib.sha256(raw_rows + structure.encode("utf-8")).hexdigest()[:12]
+        extension = ".jsonl" if uploaded_rows.name.endswith(".jsonl") else ".csv"
+        input_path = os.path.join(BATCH_DIR, f"{job_id}_input{extension}")
+        output_path = os.path.join(BATCH_DIR, f"{job_id}_results.jsonl")
+        with open(input_path, "wb") as f:
+            f.write(raw_rows)
+
+        batch_progress = st.progress(0.0, text="Starting batch...")
+
+        def report_batch_progress(result, done, total):
+            batch_progress.progress(done / total, text=f"{done}/{total} rows finished")
+
+        try:
+            summary = run_batch(
+                structure, read_rows(input_path), output_path,
+                temperature=batch_temperature, max_tokens=batch_max_tokens,
+                max_workers=batch_workers, requests_per_minute=batch_rpm,
+                on_result=report_batch_progress, user_id=user_id
+            )
+            st.session_state["batch_output_path"] = output_path
+            st.success(f"✅ Batch finished: {summary['ok']} ok, {summary['error']} failed, {summary['skipped']} already done.")
+        except Exception as e:
+            st.error(f"Batch failed: {e}")
+
+    if st.session_state.get("batch_output_path") and os.path.exists(st.session_state["batch_output_path"]):
+        with open(st.session_state["batch_output_path"], "r", encoding="utf-8") as f:
+            st.download_button("⬇️ Download results (.jsonl)", data=f.read(), file_name="batch_results.jsonl", mime="application/json")
+
 # 🔗 Prompt chaining section
+mark_section("chaining")
 st.markdown("---")
 st.title("🔗 Prompt Chaining")
 
@@ -290,6 +535,7 @@ with st.expander("🔗 Prompt Chaining", expanded=False):
         st.session_state.chaining_steps = [""]
         st.session_state["initial_input"] = ""
         st.session_state["chain_outputs"] = []
+        st.session_state["chain_reused"] = []
         st.session_state["chain_rating"] = 3
         st.session_state["chain_feedback"] = ""
         st.session_state["chaining_feedback_submitted"] = False
@@ -302,6 +548,7 @@ with st.expander("🔗 Prompt Chaining", expanded=False):
     # 🧩 Build Prompt Chain
     st.subheader("🧩 Build Your Prompt Chain")
     st.markdown("Define a sequence of prompts. Each step will take the output of the previous step as input.")
+    st.caption("Use `{input}` for the previous step's output, `{initial_input}` for the initial input, or `{step1}`, `{step2}`… for a specific earlier step. Steps that don't depend on each other run in parallel.")
 
     for i in range(len(st.session_state.chaining_steps)):
         key = f"chaining_step_{i}"
@@ -336,24 +583,70 @@ with st.expander("🔗 Prompt Chaining", expanded=False):
     st.markdown("### ⚙️ Generation Parameters")
     temperature = st.slider("Temperature", 0.0, 1.0, 0.7, step=0.05, key="chaining_temp")
     max_tokens = st.number_input("Max Tokens", 10, 2048, 1500, key="chaining_tokens")
+    chain_fresh = st.checkbox("🔄 Skip cache (always ask the model again)", key="chaining_skip_cache")
 
     # ▶️ Run chaining
     if st.button("▶️ Run Chaining", key="run_chain_button"):
         steps = st.session_state.chaining_steps
+        all_outputs = []
+        reused_steps = []
+        failed_outputs = None
+        chain_error = None
+        try:
+            parallel_chain = has_parallel_steps(steps)
+        except ValueError as ve:
+            chain_error = str(ve)
 
         if not initial_input.strip() or any(not step.strip() for step in steps):
             st.warning("⚠️ Please fill in the initial input and all chaining steps before running.")
+        elif chain_error:
+            st.error(chain_error)
+        elif parallel_chain:
+            # 🕸️ Independent steps run concurrently
+            with st.spinner("Running independent steps in parallel..."):
+                try:
+                    all_outputs = run_chaining(steps, initial_input, temperature, max_tokens, use_cache=not chain_fresh,
+                                               reused=reused_steps, user_id=user_id)
+                except ChainError as ce:
+                    failed_outputs = ce.outputs
+                    st.error(f"🛑 Chain stopped. {ce}")
         else:
-            all_outputs = run_chaining(steps, initial_input, temperature, max_tokens)
+            # ⚡ Stream each step's output live while the chain runs
+            live_chain = st.empty()
+            try:
+                with live_chain.container():
+                    for step, prompt, token_stream in stream_chaining(steps, initial_input, temperature, max_tokens,
+                                                                      use_cache=not chain_fresh, reused=reused_steps,
+                                                                      user_id=user_id):
+                        reused_label = " ♻️ reused" if len(all_outputs) in reused_steps else ""
+                        with st.expander(f"🔹 {step}{reused_label}", expanded=True):
+                            st.markdown("🧾 Prompt:")
+                            st.code(prompt, language="markdown")
+                            st.markdown("🧠 Output:")
+                            result = st.write_stream(token_stream)
+                        all_outputs.append((step, prompt, result))
+            except GenerationError as e:
+                failed_outputs, all_outputs = all_outputs, []
+                st.error(f"🛑 Chain stopped. Step {len(failed_outputs) + 1} failed: {e}")
+            live_chain.empty()
+
+        if failed_outputs is not None:
+            # Keep the steps that worked on screen, but don't log a broken chain
+            st.session_state["chain_outputs"] = failed_outputs
+            st.session_state["chain_reused"] = reused_steps
+            st.session_state.pop("chain_log_key", None)
+
+        if all_outputs:
             st.session_state["chain_outputs"] = all_outputs
+            st.session_state["chain_reused"] = reused_steps
             st.session_state["chaining_feedback_submitted"] = False
+            if reused_steps:
+                st.info(f"♻️ Reused {len(reused_steps)} of {len(all_outputs)} steps from the previous run; "
+                        "only changed or failed steps were generated.")
 
             # ✅ Build chain_steps
             chain_steps = []
             for idx, (step, prompt, result) in enumerate(all_outputs):
-                print(f"\n🔹 [FULL RESPONSE for Step {idx+1}]:\n{result}")
-                print(f"🧾 [RESPONSE LENGTH for Step {idx+1}]: {len(result)}\n")
-
                 chain_steps.append({
                     "step": step or f"Step {idx+1}",
                     "prompt": prompt or "",
@@ -371,21 +664,22 @@ with st.expander("🔗 Prompt Chaining", expanded=False):
                     "timestamp": datetime.now().isoformat()
                 },
                 chain_steps=chain_steps,
-                uid=st.session_state.user["email"].replace(".", "_")
+                uid=user_id
             )
 
             if log_key:
-                st.session_state.chain_keys[log_timestamp] = log_key
                 st.session_state["chain_log_key"] = log_key
-                st.session_state["chain_log_uid"] = st.session_state.user.get("uid") or st.session_state.user["email"].replace(".", "_")
+                st.session_state["chain_log_uid"] = user_id
 
     # ✅ Show Chained Output
     if st.session_state.get("chain_outputs"):
         all_outputs = st.session_state["chain_outputs"]
+        reused_steps = st.session_state.get("chain_reused", [])
 
         st.subheader("🔗 Chained Output")
         for idx, (step, prompt, result) in enumerate(all_outputs):
-            with st.expander(f"🔹 Step {idx+1}: {step}", expanded=False):
+            reused_label = " ♻️ reused" if idx in reused_steps else ""
+            with st.expander(f"🔹 Step {idx+1}: {step}{reused_label}", expanded=False):
                 st.markdown("🧾 Prompt:")
                 st.code(prompt, language="markdown")
                 st.markdown("🧠 Output:")
@@ -432,6 +726,8 @@ with st.expander("🔗 Prompt Chaining", expanded=False):
                     rating=rating,
                     feedback=feedback
                 )
+                if "history_view" in st.session_state:
+                    set_summary_rating(st.session_state.history_view, st.session_state["chain_log_key"], rating)
                 st.success("✅ Feedback submitted.")
                 st.session_state["chaining_feedback_submitted"] = True
             else:
@@ -445,8 +741,36 @@ with st.expander("🔗 Prompt Chaining", expanded=False):
         st.session_state.clear_chaining = True
         st.rerun()
 
+# 📊 Quality analytics across all users, read from the rollups only
+if st.session_state.user["email"].lower() in ADMIN_EMAILS:
+    mark_section("analytics")
+    st.markdown("---")
+    st.title("📊 Quality Analytics")
+
+    with st.expander("📊 Ratings by Parameter", expanded=False):
+        if st.button("🔄 Load Analytics", key="load_rollups") or "rollups" not in st.session_state:
+            try:
+                st.session_state.rollups = fetch_rollups()
+            except Exception as e:
+                st.session_state.rollups = None
+                st.error(f"Failed to load analytics: {e}")
+
+        if st.session_state.get("rollups"):
+            dimension = st.radio("Group by", ROLLUP_DIMENSIONS, horizontal=True, key="rollup_dimension",
+                                 format_func=lambda d: d.replace("_", " ").title())
+            rows = st.session_state.rollups[dimension]
+            if rows:
+                st.caption("Counted as logs are written and rated; a changed rating replaces the old one.")
+                st.dataframe(rows, hide_index=True)
+                rated_rows = [row for row in rows if row["avg_rating"] is not None]
+                if rated_rows:
+                    st.bar_chart(rated_rows, x=dimension, y="avg_rating")
+            else:
+                st.info("Nothing recorded yet.")
+
 
 #view prompt history 
+mark_section("history")
 st.markdown("---")
 st.subheader("📚 View Your Prompt History")
 
@@ -459,10 +783,7 @@ if "user" not in st.session_state or "email" not in st.session_state.user:
 defaults = {
     "show_history": False,
     "load_history_now": False,
-    "prompt_logs": [],
-    "chain_logs": [],
-    "prompt_keys": {},
-    "chain_keys": {},
+    "history_view": new_history_view(),
 }
 for key, value in defaults.items():
     if key not in st.session_state:
@@ -476,93 +797,145 @@ if st.button(toggle_label, key="toggle_history"):
         st.session_state.load_history_now = True
     st.rerun()
 
+def render_log_entry(entry):
+    if entry.get("chain"):
+        st.markdown("🔗 Chaining Workflow:")
+        st.markdown(f"Initial Input: {entry.get('prompt', '')}")
+        for c in entry["chain"]:
+            st.markdown(f"- 🔹 {c['step']} Prompt:")
+            st.code(c["prompt"], language="markdown")
+            st.markdown("🧠 Response:")
+            st.write(c["response"])
+    else:
+        st.code(entry.get("prompt", ""), language="markdown")
+        st.markdown("🧠 AI Response:")
+        st.write(entry.get("response", "No response"))
+
 # --- 📦 Load and Show History ---
 if st.session_state.show_history:
     st.info(f"📌 Currently logged in as: {st.session_state.user['email']}")
-    user_id = st.session_state.user.get("uid") or st.session_state.user["email"].replace(".", "_")
+    history_view = st.session_state.history_view
     if st.session_state.load_history_now:
         st.session_state.load_history_now = False
         try:
-            logs = db.child("logs").child(user_id).get()
-            st.session_state.prompt_logs = []
-            st.session_state.chain_logs = []
-            st.session_state.prompt_keys = {}
-            st.session_state.chain_keys = {}
-
-            if logs.each():
-                for item in logs.each():
-                    entry = item.val()
-                    key = item.key()
-                    if entry.get("chain"):
-                        st.session_state.chain_logs.append(entry)
-                        st.session_state.chain_keys[entry["timestamp"]] = key
-                    else:
-                        st.session_state.prompt_logs.append(entry)
-                        st.session_state.prompt_keys[entry["timestamp"]] = key
+            # Only entries newer than what we already have are downloaded
+            sync_new(history_view, user_id)
         except Exception as e:
             st.error(f"Failed to load history: {e}")
 
-    # 🔗 Chaining History
-    if st.session_state.chain_logs:
-        st.markdown("## 🔗 Chaining History")
-        for entry in st.session_state.chain_logs:
-            raw_time = entry.get("timestamp", "Unknown Time")
-            try:
-                readable_date = datetime.fromisoformat(raw_time).strftime("%d %b %Y")
-            except:
-                readable_date = raw_time
-
-            with st.expander(f"🕒 {readable_date} — Initial Input: {entry.get('prompt', '')[:50]}..."):
-                st.markdown("🔗 Chaining Workflow:")
-                for c in entry["chain"]:
-                    st.markdown(f"- 🔹 {c['step']} Prompt:")
-                    st.code(c["prompt"], language="markdown")
-                    st.markdown("🧠 Response:")
-                    st.write(c["response"])
-
-                delete_key = st.session_state.chain_keys.get(entry["timestamp"])
-                if st.button("🗑️ Delete This Entry", key=f"delete_chain_{delete_key}"):
-                    try:
-                        db.child("logs").child(user_id).child(delete_key).remove()
-                        st.success("Deleted successfully. Reloading...")
-                        st.session_state.load_history_now = True
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Failed to delete: {e}")
-
-    # 🧠 Single Prompt History
-    if st.session_state.prompt_logs:
-        st.markdown("## 🧠 Single Prompt History")
-        for entry in st.session_state.prompt_logs:
-            raw_time = entry.get("timestamp", "Unknown Time")
-            try:
-                readable_date = datetime.fromisoformat(raw_time).strftime("%d %b %Y")
-            except:
-                readable_date = raw_time
-
-            with st.expander(f"🕒 {readable_date} — Prompt: {entry.get('prompt', '')[:50]}..."):
-                st.code(entry.get("prompt", ""), language="markdown")
-                st.markdown("🧠 AI Response:")
-                st.write(entry.get("response", "No response"))
+    # 🔍 Search runs against a local index; only new logs and opened hits are downloaded
+    with st.expander("🔍 Search History", expanded=False):
+        if not history_index.enabled:
+            st.info("Search is off (SEARCH_DB_PATH is empty or the index could not be opened).")
+        else:
+            search_text = st.text_input("Keywords (use word* for prefixes)", key="history_search_text")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                date_range = st.date_input("Date range", value=(), key="history_search_dates")
+            with col2:
+                min_rating = st.selectbox("Minimum rating", [None, 1, 2, 3, 4, 5], key="history_search_rating",
+                                          format_func=lambda r: "Any" if r is None else "⭐" * r)
+            with col3:
+                template_filter = st.selectbox("Template", [None] + history_index.templates(user_id), key="history_search_template",
+                                               format_func=lambda t: "Any" if t is None else t)
+            temperature_range = st.slider("Temperature", 0.0, 1.0, (0.0, 1.0), step=0.05, key="history_search_temp")
+            searching = bool(search_text.strip() or date_range or min_rating or template_filter
+                             or temperature_range != (0.0, 1.0))
+
+            # The catch-up download only happens once the user actually searches (or asks for it)
+            update_clicked = st.button("🔄 Update Index", key="history_index_sync")
+            if update_clicked or (searching and st.session_state.get("history_index_synced") != user_id):
+                try:
+                    with st.spinner("Updating the search index..."):
+                        history_index.sync_user(user_id)
+                    st.session_state.history_index_synced = user_id
+                except Exception as e:
+                    st.error(f"Failed to update the search index: {e}")
 
-                delete_key = st.session_state.prompt_keys.get(entry["timestamp"])
-                if st.button("🗑️ Delete This Entry", key=f"delete_prompt_{delete_key}"):
+            if not searching:
+                st.caption("Enter keywords or pick a filter to search.")
+                hits = []
+            else:
+                hits = history_index.search(
+                    user_id, search_text,
+                    date_from=date_range[0] if len(date_range) > 0 else None,
+                    date_to=date_range[1] if len(date_range) > 1 else None,
+                    min_rating=min_rating,
+                    temperature_range=None if temperature_range == (0.0, 1.0) else temperature_range,
+                    template=template_filter,
+                )
+                st.caption(f"{len(hits)} match(es)")
+            for hit in hits:
+                kind = "🔗 Chain" if hit["is_chain"] else "🧠 Prompt"
+                st.markdown(f"**{kind}** · 🕒 {(hit['timestamp'] or '')[:16]} · ⭐ {hit['rating'] or '–'}"
+                            + (f" · 📄 {hit['template']}" if hit["template"] else ""))
+                st.markdown(hit["snippet"] or "")
+                if st.button("📂 Open", key=f"search_open_{hit['key']}"):
                     try:
-                        db.child("logs").child(user_id).child(delete_key).remove()
-                        st.success("Deleted successfully. Reloading...")
-                        st.session_state.load_history_now = True
-                        st.rerun()
+                        st.session_state.search_opened = (hit["key"], fetch_entry(user_id, hit["key"]))
                     except Exception as e:
-                        st.error(f"Failed to delete: {e}")
-
-    # 🔍 No History Case
-    if not st.session_state.prompt_logs and not st.session_state.chain_logs:
-        st.info("No history found.")
-
-
+                        st.error(f"Failed to load entry: {e}")
 
+            opened = st.session_state.get("search_opened")
+            if opened and opened[1]:
+                st.markdown("---")
+                st.markdown(f"#### 📂 {opened[1].get('timestamp', '')}")
+                render_log_entry(opened[1])
 
+    # 📇 Only one page of compact summary rows is rendered; bodies load when a row is opened
+    rows = page_entries(history_view)
+    summaries = dict(rows)
 
+    def row_label(key):
+        summary = summaries[key]
+        raw_time = summary.get("timestamp") or "Unknown Time"
+        try:
+            readable_date = datetime.fromisoformat(raw_time).strftime("%d %b %Y %H:%M")
+        except ValueError:
+            readable_date = raw_time
+        kind = f"🔗 {summary['steps']} steps" if summary.get("steps") else "🧠 Prompt"
+        rating = "⭐" * summary["rating"] if summary.get("rating") else "–"
+        return f"🕒 {readable_date} · {kind} · {rating} · {summary.get('preview', '')}…"
+
+    if rows:
+        total = f"{len(history_view['entries'])}{'+' if history_view['cursor'] else ''}"
+        st.caption(f"Page {history_view['page'] + 1} · {total} entries loaded")
+        opened_key = st.radio("History", [key for key, _ in rows], index=None, format_func=row_label,
+                              key=f"history_row_{history_view['page']}", label_visibility="collapsed")
+        if opened_key:
+            try:
+                render_log_entry(open_entry(history_view, user_id, opened_key))
+            except Exception as e:
+                st.error(f"Failed to load entry: {e}")
+            if st.button("🗑️ Delete This Entry", key="history_delete"):
+                try:
+                    delete_entry(history_view, user_id, opened_key)
+                    st.success("Deleted successfully.")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Failed to delete: {e}")
 
+    # ⏬ Paging
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if history_view["page"] > 0 and st.button("⬅️ Newer", key="history_newer"):
+            newer_page(history_view)
+            st.rerun()
+    with col2:
+        if has_older_page(history_view) and st.button("Older ➡️", key="history_older"):
+            try:
+                older_page(history_view, user_id)
+            except Exception as e:
+                st.error(f"Failed to load more history: {e}")
+            st.rerun()
+    with col3:
+        if st.button("🔄 Check for New Entries", key="history_refresh"):
+            st.session_state.load_history_now = True
+            st.rerun()
 
+    # 🔍 No History Case
+    if not history_view["entries"]:
+        st.info("No history found.")
 
+if rerun_profile:
+    rerun_profile.finish()
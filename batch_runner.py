@@ -0,0 +1,163 @@
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from llm_scheduler import PRIORITY_BULK
+from prompt_engine import generate_prompt
+from resilience import GenerationError
+from template_engine import compile_template, TemplateRenderError
+
+OUTPUT_FIELDS = ["row", "status", "prompt", "response", "error"]
+
+
+class RateLimiter:
+    """Token bucket that allows `per_minute` calls, with bursts up to `burst`."""
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1, int(per_minute // 6))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+
+def read_rows(path):
+    """Read a .csv or .jsonl file into a list of dicts, each with a `row` id."""
+    rows = []
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rows.append(json.loads(line))
+    else:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+
+    for idx, row in enumerate(rows):
+        row.setdefault("row", str(row.get("id", idx)))
+        row["row"] = str(row["row"])
+    return rows
+
+
+def load_finished_rows(output_path):
+    # ♻️ Rows already answered successfully are skipped when a job is resumed
+    finished = set()
+    if not os.path.exists(output_path):
+        return finished
+    with open(output_path, "r", encoding="utf-8", newline="") as f:
+        if output_path.endswith(".csv"):
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for record in records:
+            if record.get("status") == "ok":
+                finished.add(str(record["row"]))
+    return finished
+
+
+def _process_row(template, row, temperature, max_tokens, limiter, user_id):
+    try:
+        prompt = template.render(row)
+    except TemplateRenderError as e:
+        return {"row": row["row"], "status": "error", "prompt": "", "response": "",
+                "error": f"Template could not be filled: {e}"}
+
+    if limiter:
+        limiter.acquire()
+    try:
+        response = generate_prompt(prompt, temperature=temperature, max_tokens=max_tokens, raise_errors=True,
+                                   user_id=user_id, priority=PRIORITY_BULK)
+    except GenerationError as e:
+        return {"row": row["row"], "status": "error", "prompt": prompt, "response": "", "error": str(e)}
+    return {"row": row["row"], "status": "ok", "prompt": prompt, "response": response, "error": ""}
+
+
+def run_batch(structure, rows, output_path, temperature=0.7, max_tokens=300,
+              max_workers=4, requests_per_minute=60, on_result=None, user_id=None):
+    """Render `structure` for every row, generate, and append results to `output_path`.
+
+    Results are written as soon as each row finishes, so an interrupted job
+    can be resumed by calling run_batch again with the same output file.
+    `on_result(result, done, total)` is called from the calling thread.
+    Calls run at bulk priority in the shared scheduler, behind interactive
+    prompts and chains; `requests_per_minute` additionally caps this job.
+    """
+    template = compile_template(structure)  # malformed templates fail before any call
+    finished = load_finished_rows(output_path)
+    todo = [row for row in rows if row["row"] not in finished]
+    summary = {"total": len(rows), "skipped": len(rows) - len(todo), "ok": 0, "error": 0}
+    limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+
+    as_csv = output_path.endswith(".csv")
+    write_header = as_csv and not os.path.exists(output_path)
+    with open(output_path, "a", encoding="utf-8", newline="") as out, \
+            ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        writer = csv.DictWriter(out, fieldnames=OUTPUT_FIELDS) if as_csv else None
+        if write_header:
+            writer.writeheader()
+
+        futures = [pool.submit(_process_row, template, row, temperature, max_tokens, limiter, user_id) for row in todo]
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            if writer:
+                writer.writerow(result)
+            else:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            summary[result["status"]] += 1
+            if on_result:
+                on_result(result, done, len(todo))
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a prompt template over every row of a CSV/JSONL file.")
+    parser.add_argument("--template", required=True, help="Template name as listed by load_templates (e.g. education_template)")
+    parser.add_argument("--input", required=True, help="Input rows (.csv or .jsonl); columns fill the template placeholders")
+    parser.add_argument("--output", required=True, help="Results file (.jsonl or .csv); existing ok rows are skipped")
+    parser.add_argument("--user-id", default=None, help="Also look up this user's Firebase templates")
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--max-tokens", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rpm", type=int, default=60, help="Max requests per minute (0 = unlimited)")
+    args = parser.parse_args()
+
+    from template_manager import load_templates
+    templates = load_templates(args.user_id)
+    if args.template not in templates:
+        parser.error(f"Unknown template '{args.template}'. Available: {', '.join(sorted(templates))}")
+
+    def report(result, done, total):
+        print(f"[{done}/{total}] row {result['row']}: {result['status']}")
+
+    try:
+        summary = run_batch(
+            templates[args.template]["structure"], read_rows(args.input), args.output,
+            temperature=args.temperature, max_tokens=args.max_tokens,
+            max_workers=args.workers, requests_per_minute=args.rpm, on_result=report, user_id=args.user_id,
+        )
+    except TemplateRenderError as e:
+        parser.error(f"Template '{args.template}' is invalid: {e}")
+    print(f"✅ Done: {summary['ok']} ok, {summary['error']} failed, {summary['skipped']} already finished.")
+
+
+if __name__ == "__main__":
+    main()
+#batch_runner
\ No newline at end of file
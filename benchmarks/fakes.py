@@ -0,0 +1,152 @@
+"""In-process stand-ins for the Cohere client and the pyrebase database.
+
+They do no I/O, so benchmark numbers measure our own code, not the network.
+"""
+import copy
+import time
+import types
+
+
+class FakeCohereClient:
+    """Answers chat()/chat_stream() with `output_words` words after `latency` seconds."""
+
+    def __init__(self, output_words=200, latency=0.0):
+        self.output_words = output_words
+        self.latency = latency
+        self.calls = 0
+
+    def _text(self, max_tokens):
+        return " ".join(["word"] * min(self.output_words, max_tokens))
+
+    def chat(self, message, temperature=0.7, max_tokens=300, model=None, stop_sequences=None):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return types.SimpleNamespace(text=self._text(max_tokens))
+
+    def chat_stream(self, message, temperature=0.7, max_tokens=300, model=None, stop_sequences=None):
+        self.calls += 1
+        for word in self._text(max_tokens).split(" "):
+            yield types.SimpleNamespace(event_type="text-generation", text=word + " ")
+
+
+class _Item:
+    def __init__(self, key, value):
+        self._key = key
+        self._value = value
+
+    def key(self):
+        return self._key
+
+    def val(self):
+        return self._value
+
+
+class _Response:
+    def __init__(self, value):
+        self._value = value
+
+    def each(self):
+        if not isinstance(self._value, dict) or not self._value:
+            return None
+        return [_Item(k, v) for k, v in self._value.items()]
+
+    def val(self):
+        return self._value
+
+
+class FakeDatabase:
+    """Dict-backed subset of pyrebase's Database API used by this app."""
+
+    def __init__(self, store=None, path=()):
+        self.store = {} if store is None else store
+        self.path = path
+        self.query = {}
+
+    def child(self, *keys):
+        path = self.path + tuple(str(k) for k in keys)
+        return FakeDatabase(self.store, path)
+
+    def _node(self, path=None, create=False):
+        node = self.store
+        for part in (self.path if path is None else path):
+            if not isinstance(node, dict) or part not in node:
+                if not create:
+                    return None
+                node[part] = {}
+            node = node[part]
+        return node
+
+    # ─── Queries ──────────────────────────────────
+    def order_by_key(self):
+        return self
+
+    def limit_to_first(self, n):
+        self.query["first"] = n
+        return self
+
+    def limit_to_last(self, n):
+        self.query["last"] = n
+        return self
+
+    def start_at(self, key):
+        self.query["start"] = key
+        return self
+
+    def end_at(self, key):
+        self.query["end"] = key
+        return self
+
+    def get(self):
+        node = self._node()
+        if isinstance(node, dict) and self.query:
+            keys = sorted(node)
+            if "start" in self.query:
+                keys = [k for k in keys if k >= self.query["start"]]
+            if "end" in self.query:
+                keys = [k for k in keys if k <= self.query["end"]]
+            if "first" in self.query:
+                keys = keys[:self.query["first"]]
+            if "last" in self.query:
+                keys = keys[-self.query["last"]:]
+            node = {k: node[k] for k in keys}
+        return _Response(copy.deepcopy(node))
+
+    # ─── Writes ───────────────────────────────────
+    def set(self, value):
+        parent = self._node(self.path[:-1], create=True)
+        parent[self.path[-1]] = copy.deepcopy(value)
+
+    def update(self, updates):
+        for key, value in updates.items():
+            full = self.path + tuple(key.strip("/").split("/"))
+            parent = self._node(full[:-1], create=True)
+            if value is None:
+                parent.pop(full[-1], None)
+            elif isinstance(value, dict) and ".sv" in value:
+                parent[full[-1]] = (parent.get(full[-1]) or 0) + value[".sv"]["increment"]
+            else:
+                parent[full[-1]] = copy.deepcopy(value)
+
+    def push(self, value):
+        from log_writer import generate_push_key
+        key = generate_push_key()
+        self.child(key).set(value)
+        return {"name": key}
+
+    def remove(self):
+        parent = self._node(self.path[:-1])
+        if isinstance(parent, dict):
+            parent.pop(self.path[-1], None)
+
+
+class FakeFirebase:
+    def __init__(self, store=None):
+        self.store = {} if store is None else store
+
+    def database(self):
+        return FakeDatabase(self.store)
+
+    def auth(self):
+        return None
+#fakes
\ No newline at end of file
@@ -0,0 +1,261 @@
+"""Microbenchmarks for the generation, chaining, templating and logging paths.
+
+Everything runs against in-process fakes (benchmarks/fakes.py), so results
+reflect this app's own overhead, not Cohere or Firebase latency.
+
+    python benchmarks/run_benchmarks.py                         # run, write bench_results.json
+    python benchmarks/run_benchmarks.py --save-baseline         # also store as the baseline
+    python benchmarks/run_benchmarks.py --compare               # flag regressions vs the baseline
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeCohereClient, FakeFirebase  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+
+# ─── Setup ────────────────────────────────────────
+
+def install_fakes(store, output_words=200):
+    import firebase_auth
+    import history_search
+    import llm_providers
+    import llm_scheduler
+
+    firebase = FakeFirebase(store)
+    firebase_auth._clients.update(firebase=firebase, auth=firebase.auth(), db=firebase.database())
+    firebase_auth.log_writer.spool_path = None  # never touch the real spool
+    history_search.history_index = history_search.HistoryIndex(":memory:")  # nor the real search index
+
+    # Measure our own overhead, not the shared rate limits
+    llm_scheduler.llm_scheduler.requests = llm_scheduler.TokenBucket(0)
+    llm_scheduler.llm_scheduler.tokens = llm_scheduler.TokenBucket(0)
+
+    fake_client = FakeCohereClient(output_words=output_words)
+    llm_providers.set_provider(llm_providers.CohereProvider("fake-model", client=fake_client))
+    return fake_client
+
+
+def make_template_dir(count):
+    folder = tempfile.mkdtemp(prefix="bench_templates_")
+    for i in range(count):
+        with open(os.path.join(folder, f"bench_{i}_template.json"), "w") as f:
+            json.dump({"structure": f"Template {i}: You are a {{role}} writing for {{audience}} in a {{tone}} tone about {{intent}}."}, f)
+    return folder
+
+
+# ─── Timing ───────────────────────────────────────
+
+def measure(fn, repeat=5, min_batch_time=0.02):
+    """Time fn() and return per-call statistics in microseconds."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_batch_time or loops >= 1 << 20:
+            break
+        loops *= 2
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops * 1e6)
+
+    samples.sort()
+    return {
+        "median_us": round(samples[len(samples) // 2], 3),
+        "min_us": round(samples[0], 3),
+        "max_us": round(samples[-1], 3),
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+# ─── Benchmarks ───────────────────────────────────
+
+def bench_generate(results, repeat):
+    from prompt_engine import generate_prompt
+    from response_cache import response_cache
+
+    prompt = "You are an HR manager writing for a candidate. " * 20
+    results["generate_prompt.uncached"] = measure(lambda: generate_prompt(prompt, use_cache=False), repeat)
+    generate_prompt(prompt)
+    results["generate_prompt.cache_hit"] = measure(lambda: generate_prompt(prompt), repeat)
+    response_cache.clear()
+
+
+def bench_chaining(results, repeat, fake_client):
+    from chaining import run_chaining
+
+    for words in (100, 1000):
+        fake_client.output_words = words
+        for length in (1, 4, 8):
+            steps = [f"Step {i}: improve this text {{input}}" for i in range(length)]
+            results[f"run_chaining.steps{length}.words{words}"] = measure(
+                lambda: run_chaining(steps, "Initial input text " * 10, max_tokens=2048, use_cache=False), repeat
+            )
+
+        fan_out = [f"Task {i} on {{initial_input}}" for i in range(4)] + ["Combine {step1} {step2} {step3} {step4}"]
+        results[f"run_chaining.fanout4.words{words}"] = measure(
+            lambda: run_chaining(fan_out, "Initial input text " * 10, max_tokens=2048, use_cache=False), repeat
+        )
+    fake_client.output_words = 200
+
+
+def bench_templates(results, repeat, store):
+    import template_manager
+
+    folder = make_template_dir(50)
+    old_dir = template_manager.TEMPLATE_DIR
+    template_manager.TEMPLATE_DIR = folder
+    store.setdefault("templates", {})["bench_user"] = {
+        f"firebase_{i}": {"structure": f"Firebase template {i} for {{role}} and {{audience}}."} for i in range(50)
+    }
+
+    def cold():
+        template_manager._local_cache["signature"] = None
+        template_manager.invalidate_user_templates("bench_user")
+        template_manager.load_templates("bench_user")
+
+    try:
+        results["load_templates.cold.local50.firebase50"] = measure(cold, repeat)
+        results["load_templates.warm.local50.firebase50"] = measure(lambda: template_manager.load_templates("bench_user"), repeat)
+    finally:
+        template_manager.TEMPLATE_DIR = old_dir
+        template_manager._local_cache["signature"] = None
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def bench_logging(results, repeat):
+    import firebase_auth
+    from firebase_auth import log_prompt_to_firebase
+
+    meta = {"role": "HR", "audience": "Candidate", "tone": "Formal", "intent": "Interview questions",
+            "temperature": 0.7, "max_tokens": 300, "rating": None, "feedback": None}
+    response = "word " * 300
+    chain = [{"step": f"Step {i+1}", "prompt": "prompt " * 200, "response": response} for i in range(6)]
+
+    results["log_prompt_to_firebase.single"] = measure(
+        lambda: log_prompt_to_firebase("bench@example.com", "prompt " * 100, response, meta, uid="bench_user"), repeat
+    )
+    results["log_prompt_to_firebase.chain6"] = measure(
+        lambda: log_prompt_to_firebase("bench@example.com", "input", response, meta, chain_steps=chain, uid="bench_user"), repeat
+    )
+    firebase_auth.log_writer.flush(30)
+
+
+def bench_prompt_assembly(results, repeat):
+    from template_manager import build_full_prompt
+
+    structure = "You are a {role} creating content for a {audience}. Use a {tone} tone to generate questions or explanations for {intent}."
+    for shots in (0, 5):
+        examples = [(f"Example input {i} " * 20, f"Example output {i} " * 40) for i in range(shots)]
+        results[f"build_full_prompt.shots{shots}"] = measure(
+            lambda: build_full_prompt(structure, "Teacher", "Students", "Formal", "Photosynthesis", examples), repeat
+        )
+
+    from template_engine import compile_template
+    rows = [{"role": f"Role {i}", "audience": "Students", "tone": "Formal", "intent": f"Topic {i}"} for i in range(1000)]
+    template = compile_template(structure)
+    results["compiled_template.render_many.rows1000"] = measure(lambda: template.render_many(rows), repeat)
+
+
+def run_all(repeat=5, only=None):
+    store = {}
+    fake_client = install_fakes(store)
+    results = {}
+    suites = {
+        "generate": lambda: bench_generate(results, repeat),
+        "chaining": lambda: bench_chaining(results, repeat, fake_client),
+        "templates": lambda: bench_templates(results, repeat, store),
+        "logging": lambda: bench_logging(results, repeat),
+        "assembly": lambda: bench_prompt_assembly(results, repeat),
+    }
+    for name, suite in suites.items():
+        if only and name not in only:
+            continue
+        print(f"▶ {name}")
+        suite()
+    return results
+
+
+# ─── Reporting ────────────────────────────────────
+
+def compare(results, baseline, threshold):
+    """Return rows of (name, baseline_us, current_us, ratio, regressed)."""
+    rows = []
+    for name, stats in sorted(results.items()):
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            rows.append((name, None, stats["median_us"], None, False))
+            continue
+        ratio = stats["median_us"] / base["median_us"] if base["median_us"] else None
+        rows.append((name, base["median_us"], stats["median_us"], ratio, ratio is not None and ratio > 1 + threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the AutoPrompt Builder microbenchmarks.")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write results (JSON)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline file for --compare / --save-baseline")
+    parser.add_argument("--compare", action="store_true", help="Compare against the baseline and exit 1 on regressions")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Allowed slowdown before flagging (0.20 = 20%%)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="Subset of suites: generate chaining templates logging assembly")
+    args = parser.parse_args()
+
+    results = run_all(args.repeat, args.only)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📌 Baseline saved to {args.baseline}")
+
+    regressed = False
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            parser.error(f"No baseline at {args.baseline}; run with --save-baseline first.")
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\n{'Benchmark':<45} {'baseline µs':>12} {'current µs':>12} {'ratio':>7}")
+        for name, base, current, ratio, slow in compare(results, baseline, args.threshold):
+            base_text = f"{base:.1f}" if base is not None else "-"
+            ratio_text = f"{ratio:.2f}" if ratio is not None else "new"
+            print(f"{name:<45} {base_text:>12} {current:>12.1f} {ratio_text:>7}{'  ⚠️ REGRESSION' if slow else ''}")
+            regressed = regressed or slow
+    else:
+        print(f"\n{'Benchmark':<45} {'median µs':>12}")
+        for name, stats in sorted(results.items()):
+            print(f"{name:<45} {stats['median_us']:>12.1f}")
+
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
+#run_benchmarks
\ No newline at end of file
@@ -0,0 +1,210 @@
+import base64
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config import BLOB_MIN_CHARS, BLOB_CACHE_ENTRIES
+
+# Prompt/response bodies live under `blobs/<user>/<sha256>` as zlib-compressed,
+# base64-encoded text. A log field then holds one of:
+#   "plain text"                          short bodies stay inline
+#   {"blob": "<sha256>"}                  the whole body
+#   {"parts": ["text", {"blob": ...}]}    a chain prompt that embeds earlier bodies
+# Blobs are shared by every log of the user that contains the same text and are
+# never rewritten. Deleting a log also deletes the blobs no other log of the
+# user refers to (history_store.delete_entry).
+
+BODY_FIELDS = ("prompt", "response")
+
+
+def blob_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def encode_blob(text):
+    packed = zlib.compress(text.encode("utf-8"), 6)
+    return {"z": base64.b64encode(packed).decode("ascii"), "n": len(text)}
+
+
+def decode_blob(payload):
+    return zlib.decompress(base64.b64decode(payload["z"])).decode("utf-8")
+
+
+def is_blob_ref(value):
+    return isinstance(value, dict) and ("blob" in value or "parts" in value)
+
+
+def has_blob_refs(entry):
+    return any(is_blob_ref(entry.get(field)) for field in BODY_FIELDS) or any(
+        is_blob_ref(step.get(field)) for step in entry.get("chain") or [] for field in BODY_FIELDS
+    )
+
+
+def referenced_blobs(entry):
+    """Hashes of every blob a stored (not hydrated) log entry refers to."""
+    hashes = set()
+    if not isinstance(entry, dict):
+        return hashes
+
+    def collect(value):
+        if is_blob_ref(value):
+            for part in value.get("parts", [value]):
+                if is_blob_ref(part):
+                    hashes.add(part["blob"])
+
+    for field in BODY_FIELDS:
+        collect(entry.get(field))
+    for step in entry.get("chain") or []:
+        for field in BODY_FIELDS:
+            collect(step.get(field))
+    return hashes
+
+
+def _split_on(text, bodies):
+    # Replace verbatim copies of earlier bodies (longest first) with references
+    parts = [text]
+    for body_hash, body in bodies:
+        split = []
+        for part in parts:
+            if not isinstance(part, str) or body not in part:
+                split.append(part)
+                continue
+            pieces = part.split(body)
+            for i, piece in enumerate(pieces):
+                if i:
+                    split.append({"blob": body_hash})
+                if piece:
+                    split.append(piece)
+        parts = split
+    return parts
+
+
+class BlobStore:
+    """Writes bodies as content-addressed blobs and reads them back through an LRU.
+
+    `fetch(user_id, blob_hash)` returns a stored payload (or None). Writes are
+    not sent from here: `pack_log` returns them so the caller can queue them
+    in the same multi-path update as the log that refers to them.
+    """
+
+    def __init__(self, fetch, cache_entries=BLOB_CACHE_ENTRIES, min_chars=BLOB_MIN_CHARS, fetch_workers=8):
+        self.fetch = fetch
+        self.cache_entries = cache_entries
+        self.min_chars = min_chars
+        self.fetch_workers = fetch_workers
+        self._texts = OrderedDict()  # (user_id, hash) -> text, also "already written"
+        self._lock = threading.Lock()
+
+    def _cached(self, user_id, body_hash):
+        with self._lock:
+            text = self._texts.get((user_id, body_hash))
+            if text is not None:
+                self._texts.move_to_end((user_id, body_hash))
+            return text
+
+    def _remember(self, user_id, body_hash, text):
+        with self._lock:
+            self._texts[(user_id, body_hash)] = text
+            self._texts.move_to_end((user_id, body_hash))
+            while len(self._texts) > self.cache_entries:
+                self._texts.popitem(last=False)
+
+    # ─── Writing ──────────────────────────────────
+    def _put(self, user_id, text, writes):
+        body_hash = blob_hash(text)
+        if self._cached(user_id, body_hash) is None:
+            writes[f"blobs/{user_id}/{body_hash}"] = encode_blob(text)
+            self._remember(user_id, body_hash, text)
+        return body_hash
+
+    def _pack(self, user_id, text, writes, earlier=()):
+        if not isinstance(text, str) or len(text) < self.min_chars:
+            return text
+        parts = _split_on(text, earlier) if earlier else [text]
+        if len(parts) == 1 and isinstance(parts[0], str):
+            return {"blob": self._put(user_id, text, writes)}
+        return {"parts": [
+            {"blob": self._put(user_id, part, writes)} if isinstance(part, str) and len(part) >= self.min_chars else part
+            for part in parts
+        ]}
+
+    def pack_log(self, user_id, entry):
+        """Return (entry_with_refs, blob_writes) for a log about to be written."""
+        writes = {}
+        packed = dict(entry)
+        earlier = []
+
+        def known(text):
+            if isinstance(text, str) and len(text) >= self.min_chars:
+                earlier.append((self._put(user_id, text, writes), text))
+                earlier.sort(key=lambda item: len(item[1]), reverse=True)
+
+        if entry.get("chain"):
+            known(entry.get("prompt"))  # the chain's initial input
+            steps = []
+            for step in entry["chain"]:
+                packed_step = dict(step)
+                packed_step["prompt"] = self._pack(user_id, step.get("prompt"), writes, earlier)
+                packed_step["response"] = self._pack(user_id, step.get("response"), writes)
+                known(step.get("response"))  # later step prompts embed this output
+                steps.append(packed_step)
+            packed["chain"] = steps
+
+        packed["prompt"] = self._pack(user_id, entry.get("prompt"), writes)
+        packed["response"] = self._pack(user_id, entry.get("response"), writes)
+        return packed, writes
+
+    # ─── Reading ──────────────────────────────────
+    def _load(self, user_id, hashes):
+        missing = [h for h in set(hashes) if self._cached(user_id, h) is None]
+        if not missing:
+            return
+        workers = max(1, min(self.fetch_workers, len(missing)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            payloads = pool.map(lambda h: self.fetch(user_id, h), missing)
+            for body_hash, payload in zip(missing, payloads):
+                if payload:
+                    self._remember(user_id, body_hash, decode_blob(payload))
+
+    def _resolve(self, user_id, value):
+        if not is_blob_ref(value):
+            return value
+        if "blob" in value:
+            text = self._cached(user_id, value["blob"])
+            return text if text is not None else "⚠️ [missing body]"
+        return "".join(self._resolve(user_id, part) if is_blob_ref(part) else part for part in value["parts"])
+
+    def hydrate(self, user_id, entry):
+        """A copy of `entry` with every blob reference replaced by its text.
+
+        All missing blobs are fetched in parallel first; entries without
+        references are returned unchanged.
+        """
+        if not isinstance(entry, dict) or not has_blob_refs(entry):
+            return entry
+
+        self._load(user_id, referenced_blobs(entry))
+
+        hydrated = dict(entry)
+        for field in BODY_FIELDS:
+            hydrated[field] = self._resolve(user_id, entry.get(field))
+        if entry.get("chain"):
+            hydrated["chain"] = [
+                dict(step, **{field: self._resolve(user_id, step.get(field)) for field in BODY_FIELDS})
+                for step in entry["chain"]
+            ]
+        return hydrated
+
+    def forget(self, user_id, hashes):
+        """Drop deleted blobs from the cache, so the next log with that text writes them again."""
+        with self._lock:
+            for body_hash in hashes:
+                self._texts.pop((user_id, body_hash), None)
+
+    def cache_stats(self):
+        with self._lock:
+            return {"entries": len(self._texts), "max_entries": self.cache_entries}
+
+#blob_store
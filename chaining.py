@@ -1,21 +1,233 @@
-from prompt_engine import generate_prompt #CODE 
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-def run_chaining(steps, initial_input, temperature=0.7, max_tokens=300):
-    all_outputs = []
-    current_input = initial_input
+import metrics
+from config import CHAIN_MAX_WORKERS, CHAIN_DEADLINE_SECONDS, CHAIN_MEMO_MAX_ENTRIES
+from llm_providers import get_provider
+from llm_scheduler import PRIORITY_CHAIN
+from prompt_engine import generate_prompt, stream_prompt, _model_id #CODE
+from resilience import Deadline, GenerationError
+from token_budget import compact_text, carry_budget
 
-    for i, step_prompt in enumerate(steps):
-        # Replace placeholder or just append the input
-        if "{input}" in step_prompt:
-            full_prompt = step_prompt.replace("{input}", current_input)
-        else:
-            full_prompt = f"{step_prompt.strip()} {current_input}"
+PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+INITIAL_INPUT = "initial_input"
 
-        # Call generate_prompt with parameters
-        output = generate_prompt(full_prompt, temperature=temperature, max_tokens=max_tokens)
+class ChainError(Exception):
+    """A step failed, so the chain stopped instead of feeding an error onward.
 
-        all_outputs.append((f"Step {i+1}", full_prompt, output))
-        current_input = output
+    `outputs` holds the (step, prompt, output) tuples that did complete.
+    """
 
-    return all_outputs
+    def __init__(self, step_index, cause, outputs):
+        super().__init__(f"Step {step_index + 1} failed: {cause}")
+        self.step_index = step_index
+        self.cause = cause
+        self.outputs = outputs
+
+def _step_parts(step, i):
+    # A step is either a plain prompt string or {"name": ..., "prompt": ...}
+    if isinstance(step, dict):
+        return step.get("name") or f"step{i+1}", step.get("prompt", "")
+    return f"step{i+1}", step
+
+def build_chain_graph(steps):
+    """Work out which earlier outputs every step consumes.
+
+    `{input}` (or no placeholder at all) keeps the classic behaviour of
+    feeding in the previous step's output. `{initial_input}` and `{<name>}`
+    of an earlier step (`{step1}`, `{step2}`, ... by default) consume those
+    outputs directly, so steps that only need the initial input do not wait
+    for each other.
+    """
+    graph = []
+    names = {}
+    all_names = {_step_parts(step, i)[0] for i, step in enumerate(steps)}
+
+    for i, step in enumerate(steps):
+        name, prompt = _step_parts(step, i)
+        if name in names or name in (INITIAL_INPUT, "input"):
+            raise ValueError(f"Step {i+1}: duplicate or reserved step name '{name}'.")
+
+        refs = set(PLACEHOLDER_RE.findall(prompt))
+        named = {ref for ref in refs if ref in names}
+        not_ready = (refs & all_names) - named
+        if not_ready:
+            raise ValueError(f"Step {i+1} uses output that is not available yet: {', '.join(sorted(not_ready))}")
+
+        uses_previous = "input" in refs or not (named or INITIAL_INPUT in refs)
+        deps = {names[ref] for ref in named}
+        if uses_previous and i > 0:
+            deps.add(i - 1)
+
+        graph.append({"name": name, "prompt": prompt, "deps": deps, "uses_previous": uses_previous})
+        names[name] = i
+
+    return graph
+
+def has_parallel_steps(steps):
+    # True when some step does not need the step right before it
+    graph = build_chain_graph(steps)
+    return any(i - 1 not in node["deps"] for i, node in enumerate(graph) if i > 0)
+
+# ♻️ Step outputs from earlier runs, keyed by everything that led up to the step
+_step_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+def step_memo_keys(graph, initial_input, temperature, max_tokens):
+    """One key per step, hashing the initial input, every step prompt up to
+    and including it, and the generation parameters.
+
+    Editing step N changes the keys of N and everything after it, so a rerun
+    can reuse steps 1..N-1 as they are.
+    """
+    digest = hashlib.sha256(json.dumps(
+        [initial_input, temperature, max_tokens, _model_id(get_provider())], ensure_ascii=False
+    ).encode("utf-8"))
+    keys = []
+    for node in graph:
+        digest.update(json.dumps([node["name"], node["prompt"]], ensure_ascii=False).encode("utf-8"))
+        keys.append(digest.copy().hexdigest())
+    return keys
+
+def _memo_get(key):
+    with _memo_lock:
+        output = _step_memo.get(key)
+        if output is not None:
+            _step_memo.move_to_end(key)
+        return output
+
+def _memo_set(key, output):
+    with _memo_lock:
+        _step_memo[key] = output
+        _step_memo.move_to_end(key)
+        while len(_step_memo) > CHAIN_MEMO_MAX_ENTRIES:
+            _step_memo.popitem(last=False)
+
+def clear_step_memo():
+    with _memo_lock:
+        _step_memo.clear()
+
+def _render_step(graph, i, initial_input, outputs):
+    node = graph[i]
+    # ✂️ Carried-over outputs share the context budget so prompts don't snowball
+    limit = carry_budget(len(node["deps"]))
+    prompt = node["prompt"].replace("{" + INITIAL_INPUT + "}", initial_input)
+    for dep in node["deps"]:
+        prompt = prompt.replace("{" + graph[dep]["name"] + "}", compact_text(outputs[dep], limit))
+
+    if not node["uses_previous"]:
+        return prompt
+    previous = compact_text(outputs[i - 1], limit) if i > 0 else initial_input
+    # Replace placeholder or just append the input
+    if "{input}" in prompt:
+        return prompt.replace("{input}", previous)
+    return f"{prompt.strip()} {previous}"
+
+def _generate_step(prompt, **kwargs):
+    with metrics.timed("chain_step"):
+        return generate_prompt(prompt, **kwargs)
+
+def run_chaining(steps, initial_input, temperature=0.7, max_tokens=300, use_cache=True,
+                 max_workers=CHAIN_MAX_WORKERS, deadline_seconds=CHAIN_DEADLINE_SECONDS, reused=None, user_id=None):
+    """Run every step and return (step, prompt, output) tuples in step order.
+
+    Steps whose prefix is unchanged since an earlier run (including a run
+    that failed further along) are taken from the step memo instead of being
+    generated again; their indices are appended to `reused` when a list is
+    passed. `use_cache=False` regenerates every step. Steps queue in the
+    shared scheduler as `user_id` at chain priority.
+    """
+    graph = build_chain_graph(steps)
+    outputs = [None] * len(graph)
+    prompts = [None] * len(graph)
+    memo_keys = step_memo_keys(graph, initial_input, temperature, max_tokens)
+    chain_deadline = Deadline(deadline_seconds)
+
+    # 🕸️ Run every step as soon as the outputs it consumes are ready
+    pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        running = {}
+        remaining = set(range(len(graph)))
+        while remaining or running:
+            for i in sorted(remaining):
+                if all(outputs[dep] is not None for dep in graph[i]["deps"]):
+                    prompts[i] = _render_step(graph, i, initial_input, outputs)
+                    remaining.discard(i)
+                    memoized = _memo_get(memo_keys[i]) if use_cache else None
+                    if memoized is not None:
+                        outputs[i] = memoized
+                        metrics.inc("chain_steps_total", source="memo")
+                        if reused is not None:
+                            reused.append(i)
+                        continue
+                    metrics.inc("chain_steps_total", source="generated")
+                    running[pool.submit(
+                        _generate_step, prompts[i], temperature=temperature, max_tokens=max_tokens,
+                        use_cache=use_cache, deadline=chain_deadline, raise_errors=True,
+                        user_id=user_id, priority=PRIORITY_CHAIN
+                    )] = i
+
+            if not running:
+                continue  # only memo hits this round; their dependents may be ready now
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                try:
+                    outputs[i] = future.result()
+                    _memo_set(memo_keys[i], outputs[i])
+                except GenerationError as e:
+                    # 🛑 Don't feed an error message into the next step
+                    completed = [(f"Step {j+1}", prompts[j], outputs[j]) for j in range(len(graph)) if outputs[j] is not None]
+                    raise ChainError(i, e, completed) from e
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    # Reported in step order, which is already a topological order
+    return [(f"Step {i+1}", prompts[i], outputs[i]) for i in range(len(graph))]
+
+def stream_chaining(steps, initial_input, temperature=0.7, max_tokens=300, use_cache=True,
+                    deadline_seconds=CHAIN_DEADLINE_SECONDS, reused=None, user_id=None):
+    """Streaming variant of run_chaining.
+
+    Yields one (step_name, full_prompt, token_stream) tuple per step, in
+    order. The caller must consume token_stream completely before asking for
+    the next step, because later prompts are built from the assembled output.
+    A failing step raises GenerationError out of its token_stream. Memoized
+    steps are appended to `reused` before they are yielded and stream their
+    stored output in one piece.
+    """
+    graph = build_chain_graph(steps)
+    outputs = [None] * len(graph)
+    memo_keys = step_memo_keys(graph, initial_input, temperature, max_tokens)
+    chain_deadline = Deadline(deadline_seconds)
+
+    for i in range(len(graph)):
+        full_prompt = _render_step(graph, i, initial_input, outputs)
+        memoized = _memo_get(memo_keys[i]) if use_cache else None
+        if memoized is not None:
+            metrics.inc("chain_steps_total", source="memo")
+            if reused is not None:
+                reused.append(i)
+            yield (f"Step {i+1}", full_prompt, iter([memoized]))
+            outputs[i] = memoized
+            continue
+        chunks = []
+        metrics.inc("chain_steps_total", source="generated")
+
+        def token_stream(prompt=full_prompt, chunks=chunks, memo_key=memo_keys[i]):
+            with metrics.timed("chain_step"):
+                for token in stream_prompt(prompt, temperature=temperature, max_tokens=max_tokens, use_cache=use_cache,
+                                           deadline=chain_deadline, raise_errors=True,
+                                           user_id=user_id, priority=PRIORITY_CHAIN):
+                    chunks.append(token)
+                    yield token
+            # Only a fully streamed step is worth remembering
+            _memo_set(memo_key, "".join(chunks))
+
+        yield (f"Step {i+1}", full_prompt, token_stream())
+        outputs[i] = "".join(chunks)
 #chaining
\ No newline at end of file
@@ -1,7 +1,7 @@
 import os
 
-# ─── OpenAI (if you plan to support it later) ───
-# OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+# ─── OpenAI (set LLM_PROVIDER=openai to use it) ───
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
 # ─── Cohere API Key ─────────────────────────────
 COHERE_API_KEY = os.getenv("COHERE_API_KEY", "RlQjCIFvOkgZr3JT2mUiEe33MMB8ZyTY6TVaxrzO")
@@ -9,4 +9,74 @@ COHERE_API_KEY = os.getenv("COHERE_API_KEY", "RlQjCIFvOkgZr3JT2mUiEe33MMB8ZyTY6T
 # ─── Apply to environment (optional; for local testing) ───
 os.environ["COHERE_API_KEY"] = COHERE_API_KEY
 # os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
+
+# ─── LLM Provider ───────────────────────────────
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "cohere")        # cohere | openai | stub
+LLM_MODEL = os.getenv("LLM_MODEL", "")                    # empty = provider default
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))       # seconds per request
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0"))           # stub: fixed delay per call
+STUB_TOKEN_LATENCY_MS = float(os.getenv("STUB_TOKEN_LATENCY_MS", "0"))  # stub: delay per token
+
+# ─── Shared Rate Limits (all sessions of this process) ───
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "600"))   # 0 = unlimited
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))    # prompt + max_tokens; 0 = unlimited
+
+# ─── Deadlines, Retries & Hedging ───────────────
+GENERATION_DEADLINE_SECONDS = float(os.getenv("GENERATION_DEADLINE_SECONDS", "90"))   # per call
+CHAIN_DEADLINE_SECONDS = float(os.getenv("CHAIN_DEADLINE_SECONDS", "600"))             # whole chain
+GENERATION_RETRIES = int(os.getenv("GENERATION_RETRIES", "2"))                         # transient errors only
+RETRY_BACKOFF_SECONDS = float(os.getenv("RETRY_BACKOFF_SECONDS", "0.5"))              # doubles per retry
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "false").lower() == "true"               # 2nd call after p95 latency
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "1.0"))
+LLM_CALL_WORKERS = int(os.getenv("LLM_CALL_WORKERS", "32"))
+
+# ─── Context Budget ─────────────────────────────
+CONTEXT_BUDGET_TOKENS = int(os.getenv("CONTEXT_BUDGET_TOKENS", "4000"))     # max prompt size sent to the model
+CHAIN_CARRY_MAX_TOKENS = int(os.getenv("CHAIN_CARRY_MAX_TOKENS", "1500"))   # max carried-over output per chain step
+
+# ─── Response Cache ─────────────────────────────
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "3600"))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "")   # e.g. "cache/responses.db" to persist
+
+# ─── Prompt Chaining ────────────────────────────
+CHAIN_MAX_WORKERS = int(os.getenv("CHAIN_MAX_WORKERS", "4"))   # parallel independent steps
+CHAIN_MEMO_MAX_ENTRIES = int(os.getenv("CHAIN_MEMO_MAX_ENTRIES", "512"))   # remembered step outputs for reruns
+
+# ─── Few-Shot Example Library ───────────────────
+EXAMPLE_EMBED_DIM = int(os.getenv("EXAMPLE_EMBED_DIM", "512"))           # hashed TF-IDF vector size
+EXAMPLE_TOP_K = int(os.getenv("EXAMPLE_TOP_K", "3"))                     # examples added to a prompt by default
+EXAMPLE_CACHE_ROWS = int(os.getenv("EXAMPLE_CACHE_ROWS", "50000"))         # example vectors kept in memory over all loaded indexes
+
+# ─── Parameter Sweeps ───────────────────────────
+SWEEP_MAX_WORKERS = int(os.getenv("SWEEP_MAX_WORKERS", "6"))       # variants generated at once
+SWEEP_MAX_VARIANTS = int(os.getenv("SWEEP_MAX_VARIANTS", "36"))     # largest grid the UI will run
+
+# ─── Firebase Log Writer ────────────────────────
+LOG_SPOOL_PATH = os.getenv("LOG_SPOOL_PATH", "log_spool.json")   # unsent logs survive restarts here
+
+# ─── Blob Storage ───────────────────────────────
+BLOB_STORAGE = os.getenv("BLOB_STORAGE", "true").lower() == "true"   # bodies as compressed, deduplicated blobs
+BLOB_MIN_CHARS = int(os.getenv("BLOB_MIN_CHARS", "200"))             # shorter bodies stay inline
+BLOB_CACHE_ENTRIES = int(os.getenv("BLOB_CACHE_ENTRIES", "512"))     # decoded bodies kept in memory
+
+# ─── Metrics ────────────────────────────────────
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))                   # serve Prometheus text on :PORT/metrics (0 = off)
+METRICS_JSONL_PATH = os.getenv("METRICS_JSONL_PATH", "")             # append a snapshot here periodically ("" = off)
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "60"))
+ADMIN_EMAILS = [e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()]   # see the metrics panel
+
+# ─── HTTP API ───────────────────────────────────
+API_KEYS = [k.strip() for k in os.getenv("API_KEYS", "").split(",") if k.strip()]   # accepted X-API-Key values ("" = local clients only)
+API_THREADS = int(os.getenv("API_THREADS", "200"))                                    # concurrent blocking backend calls
+
+# ─── Rerun Profiling ────────────────────────────
+PROFILE_RERUNS = os.getenv("PROFILE_RERUNS", "false").lower() == "true"   # time every rerun (or add ?profile=1 to the URL)
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "500"))             # reruns slower than this get a cProfile dump
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", "50"))                # recent reruns kept for the sidebar panel
+
+# ─── History Search ─────────────────────────────
+SEARCH_DB_PATH = os.getenv("SEARCH_DB_PATH", "history_index.db")   # local full-text index of logs ("" = off)
 #config
\ No newline at end of file
@@ -0,0 +1,285 @@
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+
+import numpy as np
+
+import metrics
+from config import EXAMPLE_EMBED_DIM, EXAMPLE_CACHE_ROWS
+from firebase_auth import get_firebase, log_writer
+from log_writer import generate_push_key
+
+# 📚 Saved few-shot examples live under `examples/<user>/<template>/<key>`.
+# For retrieval each (user, template) gets an in-memory index: example inputs
+# are embedded by hashing their words and word pairs into EXAMPLE_EMBED_DIM
+# buckets (signed, so collisions tend to cancel), weighted by TF-IDF and
+# L2-normalised. The vectors are the columns of one float32 matrix, and a
+# query only touches the rows of the few buckets its own words hash to, so
+# ranking is one small vector-matrix product. Loaded indexes are kept in an
+# LRU bounded by their total rows (EXAMPLE_CACHE_ROWS), since a row costs
+# 4 * EXAMPLE_EMBED_DIM bytes whoever it belongs to.
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_WORD_HASH_CACHE = 1 << 18
+_word_hashes = {}   # word -> crc32; words repeat across examples, so this is most of a load otherwise
+_LOAD_CHUNK = 4096  # examples hashed per batch when (re)building
+
+
+def _word_hash(word):
+    h = _word_hashes.get(word)
+    if h is None:
+        if len(_word_hashes) >= _WORD_HASH_CACHE:
+            _word_hashes.clear()
+        h = _word_hashes[word] = zlib.crc32(word.encode("utf-8"))
+    return h
+
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def _mix(h):
+    # 32-bit finaliser over a uint64 array, so a pair's bucket doesn't just follow the buckets of its two words
+    shift, multiplier = np.uint64(16), np.uint64(0x45D9F3B)
+    h = ((h ^ (h >> shift)) * multiplier) & _MASK32
+    h = ((h ^ (h >> shift)) * multiplier) & _MASK32
+    return h ^ (h >> shift)
+
+
+def _hashed_features(texts, dim):
+    """(text, bucket, value) arrays of the signed sub-linear counts of the words and word pairs of `texts`."""
+    hashes, owners = [], []
+    for i, text in enumerate(texts):
+        words = [_word_hash(w) for w in _WORD_RE.findall(text.lower()) if len(w) > 1]
+        hashes.extend(words)
+        owners.extend([i] * len(words))
+    words = np.array(hashes, dtype=np.uint64)
+    owners = np.array(owners, dtype=np.uint64)
+    same_text = owners[1:] == owners[:-1]
+    pairs = _mix((words[:-1] * np.uint64(0x9E3779B1) + words[1:]) & _MASK32)[same_text]
+    features = np.concatenate([words, pairs])
+    owners = np.concatenate([owners, owners[1:][same_text]])
+    keys, counts = np.unique((owners << np.uint64(32)) | features, return_counts=True)
+    features = keys & _MASK32
+    values = (1.0 + np.log(counts)) * np.where(features & np.uint64(0x80000000), 1.0, -1.0)
+    return (keys >> np.uint64(32)).astype(np.intp), (features % np.uint64(dim)).astype(np.intp), values.astype(np.float32)
+
+
+def hashed_counts(text, dim=EXAMPLE_EMBED_DIM):
+    """Sub-linear term counts of `text`, hashed into a `dim`-vector."""
+    vector = np.zeros(dim, dtype=np.float32)
+    _, buckets, values = _hashed_features([text], dim)
+    np.add.at(vector, buckets, values)
+    return vector
+
+
+def _capacity(n):
+    return n + max(16, n // 4)
+
+
+class ExampleIndex:
+    """Top-k cosine search over the examples of one user and template.
+
+    `add` and `remove` update the matrix in place. Rows are stored in a
+    buffer with a quarter of headroom that grows by the same factor when
+    full. IDF weights are fixed when the matrix is (re)built, and rows
+    added later use the current document frequencies.
+    The matrix is rebuilt once the example count has doubled, so the
+    weights stay representative at amortised O(1) per add.
+    """
+
+    def __init__(self, dim=EXAMPLE_EMBED_DIM):
+        self.dim = dim
+        self.keys = []
+        self.examples = []                                    # (input, output) per row
+        self._matrix = np.zeros((dim, 0), dtype=np.float32)  # bucket x example, columns L2-normalised; capacity >= len
+        self._df = np.zeros(dim, dtype=np.float32)           # examples with a non-zero bucket
+        self._idf = np.ones(dim, dtype=np.float32)
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _weigh(self, counts):
+        rows = counts * self._idf
+        norms = np.linalg.norm(rows, axis=-1, keepdims=True)
+        return rows / np.maximum(norms, 1e-12)
+
+    @property
+    def capacity(self):
+        return self._matrix.shape[1]
+
+    def _rebuild(self):
+        # Scatter the counts straight into the final buffer and weigh it in place, so a
+        # rebuild never holds more than the one matrix
+        n = len(self.keys)
+        matrix = np.zeros((self.dim, _capacity(n)), dtype=np.float32)
+        for first in range(0, n, _LOAD_CHUNK):
+            texts = [example_input for example_input, _ in self.examples[first:first + _LOAD_CHUNK]]
+            columns, buckets, values = _hashed_features(texts, self.dim)
+            np.add.at(matrix, (buckets, columns + first), values)
+        self._df = (matrix[:, :n] != 0).sum(axis=1).astype(np.float32)
+        self._idf = (np.log((1.0 + n) / (1.0 + self._df)) + 1.0).astype(np.float32)
+        matrix *= self._idf[:, None]
+        matrix /= np.maximum(np.sqrt(np.einsum("ij,ij->j", matrix, matrix)), 1e-12)
+        self._matrix = matrix
+        self._built_at = n
+
+    def _grow(self, n):
+        matrix = np.zeros((self.dim, _capacity(n)), dtype=np.float32)
+        matrix[:, :n - 1] = self._matrix[:, :n - 1]
+        self._matrix = matrix
+
+    def load(self, items):
+        """Replace the contents with (key, input, output) triples."""
+        with self._lock:
+            self.keys = [key for key, _, _ in items]
+            self.examples = [(example_input, example_output) for _, example_input, example_output in items]
+            self._rebuild()
+
+    def add(self, key, example_input, example_output):
+        counts = hashed_counts(example_input, self.dim)
+        with self._lock:
+            self.keys.append(key)
+            self.examples.append((example_input, example_output))
+            self._df += counts != 0
+            n = len(self.keys)
+            if n >= 2 * max(8, self._built_at):
+                self._rebuild()
+                return
+            if n > self.capacity:
+                self._grow(n)
+            self._matrix[:, n - 1] = self._weigh(counts)
+
+    def remove(self, key):
+        with self._lock:
+            if key not in self.keys:
+                return
+            # Move the last column into the hole; the order does not matter for ranking
+            i = self.keys.index(key)
+            last = len(self.keys) - 1
+            self._df -= hashed_counts(self.examples[i][0], self.dim) != 0
+            self.keys[i], self.examples[i] = self.keys[last], self.examples[last]
+            self._matrix[:, i] = self._matrix[:, last]
+            self.keys.pop()
+            self.examples.pop()
+
+    def top_k(self, query, k, min_score=0.0):
+        """The `k` examples most similar to `query`: [(key, input, output, score)], best first."""
+        with self._lock:
+            n = len(self.keys)
+            if not n or k <= 0:
+                return []
+            query_vector = self._weigh(hashed_counts(query, self.dim))
+            buckets = np.flatnonzero(query_vector)
+            scores = query_vector[buckets] @ self._matrix[buckets, :n]
+            k = min(k, n)
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [(self.keys[i], *self.examples[i], float(scores[i])) for i in best if scores[i] > min_score]
+
+
+class ExampleLibrary:
+    """Per-user, per-template example store with an LRU of loaded indexes.
+
+    The LRU is bounded by the total matrix rows of its indexes rather than
+    their number; the index in use is always kept, however large it is.
+    """
+
+    def __init__(self, max_rows=EXAMPLE_CACHE_ROWS, dim=EXAMPLE_EMBED_DIM):
+        self.max_rows = max_rows
+        self.dim = dim
+        self._indexes = OrderedDict()   # (user_id, template) -> ExampleIndex
+        self._loading = {}              # (user_id, template) -> Future
+        self._lock = threading.Lock()
+
+    def _load(self, user_id, template):
+        index = ExampleIndex(self.dim)
+        with metrics.timed("examples_load"):
+            stored = get_firebase().database().child("examples").child(user_id).child(template).get().val() or {}
+            index.load([(key, value.get("input", ""), value.get("output", ""))
+                        for key, value in sorted(stored.items()) if isinstance(value, dict)])
+        return index
+
+    def _evict(self):
+        rows = sum(index.capacity for index in self._indexes.values())
+        while rows > self.max_rows and len(self._indexes) > 1:
+            _, index = self._indexes.popitem(last=False)
+            rows -= index.capacity
+
+    def _index(self, user_id, template):
+        """The loaded index, downloading it once however many threads ask at the same time."""
+        cache_key = (user_id, template)
+        with self._lock:
+            index = self._indexes.get(cache_key)
+            if index is not None:
+                self._indexes.move_to_end(cache_key)
+                self._evict()   # indexes grow as examples are added
+                return index
+            future = self._loading.get(cache_key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._loading[cache_key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            index = self._load(user_id, template)
+            with self._lock:
+                self._indexes[cache_key] = index
+                self._evict()
+            future.set_result(index)
+            return index
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(cache_key, None)
+
+    def prefetch(self, user_id, template):
+        """Start loading an index in the background, so the rerun that needs it doesn't wait for the download."""
+        with self._lock:
+            if (user_id, template) in self._indexes or (user_id, template) in self._loading:
+                return
+        threading.Thread(target=self._prefetch, args=(user_id, template), name="example-prefetch", daemon=True).start()
+
+    def _prefetch(self, user_id, template):
+        try:
+            self._index(user_id, template)
+        except Exception as e:
+            print("[Example Library] Prefetch failed:", e)
+
+    def add(self, user_id, template, example_input, example_output):
+        """Save an example (written in the background) and index it; returns its key."""
+        # Load the index first: a load that finished after the write landed would already hold the example
+        index = self._index(user_id, template)
+        key = generate_push_key()
+        log_writer.enqueue({f"examples/{user_id}/{template}/{key}": {
+            "input": example_input, "output": example_output, "created": datetime.now().isoformat(),
+        }})
+        index.add(key, example_input, example_output)
+        return key
+
+    def remove(self, user_id, template, key):
+        log_writer.discard(f"examples/{user_id}/{template}/{key}")
+        get_firebase().database().child("examples").child(user_id).child(template).child(key).remove()
+        self._index(user_id, template).remove(key)
+
+    def count(self, user_id, template):
+        return len(self._index(user_id, template))
+
+    def retrieve(self, user_id, template, query, k):
+        """The `k` saved examples closest to `query` as [(input, output, score)], best first."""
+        with metrics.timed("examples_retrieve"):
+            return [(example_input, example_output, score)
+                    for _, example_input, example_output, score in self._index(user_id, template).top_k(query, k)]
+
+
+example_library = ExampleLibrary()
+#example_library
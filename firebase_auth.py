@@ -1,15 +1,68 @@
-import pyrebase
 from firebase_config import firebase_config
+from config import LOG_SPOOL_PATH, BLOB_STORAGE
+import metrics
+from blob_store import BlobStore
+from log_writer import LogWriter, generate_push_key
+from startup_timing import timed
+from token_budget import count_tokens
 from datetime import datetime
+import threading
+import time
 import traceback
 
-firebase = pyrebase.initialize_app(firebase_config)
-auth = firebase.auth()
-db = firebase.database()
+# 💤 pyrebase and its clients are created on first use, once per process
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_firebase():
+    with _clients_lock:
+        if "firebase" not in _clients:
+            with timed("import pyrebase"):
+                import pyrebase
+            with timed("firebase initialize_app"):
+                _clients["firebase"] = pyrebase.initialize_app(firebase_config)
+        return _clients["firebase"]
+
+def get_auth():
+    firebase = get_firebase()
+    with _clients_lock:
+        if "auth" not in _clients:
+            _clients["auth"] = firebase.auth()
+        return _clients["auth"]
+
+def get_db():
+    """A new Database handle for one read or write.
+
+    pyrebase keeps the current child path and query on the Database
+    instance, so a shared one lets concurrent requests (API worker threads,
+    Streamlit sessions) read each other's paths. Handles are cheap; use a
+    fresh one per operation and don't keep it around.
+    """
+    return get_firebase().database()
+
+def __getattr__(name):
+    # Keeps `firebase_auth.db` / `.auth` / `.firebase` working, lazily
+    if name == "db":
+        return get_db()
+    if name == "auth":
+        return get_auth()
+    if name == "firebase":
+        return get_firebase()
+    raise AttributeError(f"module 'firebase_auth' has no attribute '{name}'")
+
+# ✍️ Logs are written in the background, in batched multi-path updates
+def _send_updates(updates):
+    with metrics.timed("firebase_write"):
+        get_db().update(updates)
+
+log_writer = LogWriter(send=_send_updates, spool_path=LOG_SPOOL_PATH)
+
+# 🗜️ Prompt/response bodies are stored once per user under blobs/<user>/<sha256>
+blob_store = BlobStore(fetch=lambda user_id, blob_hash: get_db().child("blobs").child(user_id).child(blob_hash).get().val())
 
 def signup(email, password):
     try:
-        return auth.create_user_with_email_and_password(email, password)
+        return get_auth().create_user_with_email_and_password(email, password)
     except Exception as e:
         try:
             error_msg = e.args[1]
@@ -23,11 +76,11 @@ def signup(email, password):
 
 
 def login(email, password):
+    # The sign-in response already carries localId; no get_account_info round trip
     try:
-        user = auth.sign_in_with_email_and_password(email, password)
-        user_info = auth.get_account_info(user['idToken'])
-        uid = user_info['users'][0]['localId']
-        return {"email": email, "uid": uid}
+        with metrics.timed("firebase_login"):
+            response = get_auth().sign_in_with_email_and_password(email, password)
+        return {"email": email, "uid": response["localId"]}
     except Exception as e:
         try:
             error_msg = e.args[1]
@@ -37,7 +90,20 @@ def login(email, password):
             pass
         raise ValueError("Login failed. Please try again.")
 
+PREVIEW_CHARS = 50
+
+def log_summary(entry):
+    # 📇 Small projection of a log, enough to list it without downloading bodies
+    return {
+        "timestamp": entry.get("timestamp"),
+        "preview":   (entry.get("prompt") or "")[:PREVIEW_CHARS],
+        "rating":    entry.get("rating"),
+        "steps":     len(entry.get("chain") or []),
+        "rollup":    entry.get("rollup"),   # rollup values it was counted under (None for older logs)
+    }
+
 def log_prompt_to_firebase(email, prompt, response, meta, chain_steps=None, uid=None):
+    start = time.perf_counter()
     try:
         user_id = uid if uid else email.replace(".", "_")
 
@@ -56,8 +122,13 @@ def log_prompt_to_firebase(email, prompt, response, meta, chain_steps=None, uid=
             "intent":       meta.get("intent"),
             "temperature":  meta.get("temperature"),
             "max_tokens":   meta.get("max_tokens"),
+            "template":     meta.get("template"),
             "rating":       meta.get("rating"),    
-            "feedback":     meta.get("feedback")
+            "feedback":     meta.get("feedback"),
+            "sweep_id":     meta.get("sweep_id"),
+            "latency_ms":   meta.get("latency_ms"),
+            "prompt_tokens":   count_tokens(prompt),
+            "response_tokens": count_tokens(response)
         }
 
         if meta.get("rating") is not None:
@@ -65,26 +136,56 @@ def log_prompt_to_firebase(email, prompt, response, meta, chain_steps=None, uid=
         if meta.get("feedback"):
             data["feedback"] = meta["feedback"]
         if chain_steps:
-            data["chain"] = chain_steps
+            data["chain"] = [
+                dict(step, prompt_tokens=count_tokens(step.get("prompt", "")), response_tokens=count_tokens(step.get("response", "")))
+                for step in chain_steps
+            ]
 
-        # 🔐 Push and get the log key
-        result = db.child("logs").child(user_id).push(data)
-        return result["name"], timestamp  # 🔁 Return Firebase key and timestamp
+        # 🔐 Generate the key locally and queue the write
+        log_key = generate_push_key()
+        # 📊 Rollup counters go out in the same update as the log they count
+        from rollups import rollup_dims, log_updates
+        data["rollup"] = rollup_dims(data)
+        record, blob_writes = blob_store.pack_log(user_id, data) if BLOB_STORAGE else (data, {})
+        log_writer.enqueue({
+            **blob_writes,
+            f"logs/{user_id}/{log_key}": record,
+            f"log_summaries/{user_id}/{log_key}": log_summary(data),
+            **log_updates(log_key, data["rollup"], data.get("rating")),
+        })
+
+        # 🔍 Searchable right away, without waiting for a sync
+        from history_search import history_index
+        history_index.index_entry(user_id, log_key, data)
+        metrics.observe("firebase_log", time.perf_counter() - start)
+        return log_key, timestamp  # 🔁 Return Firebase key and timestamp
 
     except Exception as e:
+        metrics.observe("firebase_log", time.perf_counter() - start, error=True)
         print("[Firebase Log Error]", e)
         traceback.print_exc()
         return None, None  # ❌ Failed
 
 def update_feedback_in_firebase(user_id, log_key, rating=None, feedback=None):
+    start = time.perf_counter()
     try:
         updates = {}
         if rating is not None:
-            updates["rating"] = rating
+            updates[f"logs/{user_id}/{log_key}/rating"] = rating
+            updates[f"log_summaries/{user_id}/{log_key}/rating"] = rating
         if feedback:
-            updates["feedback"] = feedback
-        db.child("logs").child(user_id).child(log_key).update(updates)
+            updates[f"logs/{user_id}/{log_key}/feedback"] = feedback
+        if rating is not None:
+            from rollups import rating_updates
+            updates.update(rating_updates(user_id, log_key, rating))
+        if updates:
+            log_writer.enqueue(updates)
+        if rating is not None:
+            from history_search import history_index
+            history_index.update_rating(user_id, log_key, rating)
+        metrics.observe("firebase_feedback", time.perf_counter() - start)
     except Exception as e:
+        metrics.observe("firebase_feedback", time.perf_counter() - start, error=True)
         print(f"[Firebase Feedback Update Error]: {e}")
         traceback.print_exc()
 #auth.py
\ No newline at end of file
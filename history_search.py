@@ -0,0 +1,252 @@
+import os
+import re
+import sqlite3
+import threading
+
+from config import SEARCH_DB_PATH
+from firebase_auth import get_db, blob_store
+
+SYNC_BATCH = 200
+_TERM_RE = re.compile(r"\w+\*?", re.UNICODE)
+
+# Column order of the FTS table, with the bm25 weight of each column
+_FTS_COLUMNS = ("prompt", "response", "chain", "role", "audience", "tone", "intent")
+_FTS_WEIGHTS = (3.0, 1.0, 1.0, 2.0, 2.0, 1.0, 2.0)
+
+
+def _fts_query(text):
+    # Quote every term so user input can't use (or break) FTS syntax; "term*" keeps prefix search
+    terms = []
+    for term in _TERM_RE.findall(text):
+        word = term.rstrip("*")
+        terms.append(f'"{word}"' + ("*" if term.endswith("*") else ""))
+    return " ".join(terms)
+
+
+def _chain_text(entry):
+    return "\n".join(f"{step.get('prompt', '')}\n{step.get('response', '')}" for step in entry.get("chain") or [])
+
+
+class HistoryIndex:
+    """Local SQLite FTS5 index over every user's `logs/<user>` entries.
+
+    New logs are indexed as they are written; `sync_user` catches up on logs
+    written elsewhere (another device, another server). Entries deleted
+    elsewhere stay searchable until they are deleted here or the index file
+    is removed.
+    """
+
+    def __init__(self, db_path):
+        # The database is opened on first use, so importing this module creates no file
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._opened = False
+
+    def _init_db(self):
+        try:
+            folder = os.path.dirname(self.db_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            # Each log is indexed on the request path, so skip the fsync per commit
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, key TEXT NOT NULL, "
+                    "timestamp TEXT, day TEXT, rating INTEGER, temperature REAL, template TEXT, "
+                    "is_chain INTEGER NOT NULL DEFAULT 0, preview TEXT, UNIQUE (user_id, key))"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS entries_user_day ON entries (user_id, day)")
+                conn.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5({', '.join(_FTS_COLUMNS)})"
+                )
+                conn.execute("CREATE TABLE IF NOT EXISTS sync_state (user_id TEXT PRIMARY KEY, last_key TEXT)")
+            self._conn = conn
+        except sqlite3.Error as e:
+            print("[History Search] Disabling search index:", e)
+            self._conn = None
+
+    @property
+    def enabled(self):
+        if not self._opened:
+            with self._lock:
+                if not self._opened:
+                    if self.db_path:
+                        self._init_db()
+                    self._opened = True
+        return self._conn is not None
+
+    # ─── Writes ───────────────────────────────────
+    def _upsert(self, conn, user_id, key, entry):
+        row = conn.execute("SELECT id FROM entries WHERE user_id = ? AND key = ?", (user_id, key)).fetchone()
+        if row:
+            conn.execute("DELETE FROM entries_fts WHERE rowid = ?", (row[0],))
+            conn.execute("DELETE FROM entries WHERE id = ?", (row[0],))
+
+        timestamp = entry.get("timestamp") or ""
+        cursor = conn.execute(
+            "INSERT INTO entries (user_id, key, timestamp, day, rating, temperature, template, is_chain, preview) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, key, timestamp, timestamp[:10], entry.get("rating"), entry.get("temperature"),
+             entry.get("template"), 1 if entry.get("chain") else 0, (entry.get("prompt") or "")[:100]),
+        )
+        conn.execute(
+            f"INSERT INTO entries_fts (rowid, {', '.join(_FTS_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (cursor.lastrowid, entry.get("prompt") or "", entry.get("response") or "", _chain_text(entry),
+             entry.get("role") or "", entry.get("audience") or "", entry.get("tone") or "", entry.get("intent") or ""),
+        )
+
+    def index_entries(self, user_id, items):
+        """Add or replace (key, entry) pairs in one transaction."""
+        if not self.enabled:
+            return
+        try:
+            with self._lock, self._conn:
+                for key, entry in items:
+                    if isinstance(entry, dict):
+                        self._upsert(self._conn, user_id, key, entry)
+        except sqlite3.Error as e:
+            print("[History Search] Indexing failed:", e)
+
+    def index_entry(self, user_id, key, entry):
+        self.index_entries(user_id, [(key, entry)])
+
+    def update_rating(self, user_id, key, rating):
+        if not self.enabled:
+            return
+        try:
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE entries SET rating = ? WHERE user_id = ? AND key = ?", (rating, user_id, key))
+        except sqlite3.Error as e:
+            print("[History Search] Rating update failed:", e)
+
+    def remove(self, user_id, key):
+        if not self.enabled:
+            return
+        try:
+            with self._lock, self._conn:
+                row = self._conn.execute("SELECT id FROM entries WHERE user_id = ? AND key = ?", (user_id, key)).fetchone()
+                if row:
+                    self._conn.execute("DELETE FROM entries_fts WHERE rowid = ?", (row[0],))
+                    self._conn.execute("DELETE FROM entries WHERE id = ?", (row[0],))
+        except sqlite3.Error as e:
+            print("[History Search] Remove failed:", e)
+
+    # ─── Sync from Firebase ───────────────────────
+    def _last_synced(self, user_id):
+        with self._lock:
+            row = self._conn.execute("SELECT last_key FROM sync_state WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def _indexed_keys(self, user_id, keys):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key FROM entries WHERE user_id = ? AND key IN ({', '.join('?' * len(keys))})",
+                (user_id, *keys),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def sync_user(self, user_id, batch=SYNC_BATCH):
+        """Index the logs written since the last sync, `batch` at a time.
+
+        Push keys sort chronologically, so only keys after the last synced
+        one are listed. Logs this process already indexed as it wrote them
+        are skipped, so their bodies are not downloaded again. Returns how
+        many entries were indexed.
+        """
+        if not self.enabled:
+            return 0
+        last_key = self._last_synced(user_id)
+        indexed = 0
+        while True:
+            query = get_db().child("logs").child(user_id).order_by_key()
+            if last_key:
+                query = query.start_at(last_key)
+            result = query.limit_to_first(batch + 1).get()
+            items = [(item.key(), item.val()) for item in (result.each() or []) if item.key() != last_key]
+            if not items:
+                break
+            known = self._indexed_keys(user_id, [key for key, _ in items])
+            new_items = [(key, entry) for key, entry in items if key not in known]
+            self.index_entries(user_id, [(key, blob_store.hydrate(user_id, entry)) for key, entry in new_items])
+            indexed += len(new_items)
+            last_key = items[-1][0]
+            with self._lock, self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO sync_state (user_id, last_key) VALUES (?, ?)", (user_id, last_key))
+            if len(items) < batch:
+                break
+        return indexed
+
+    # ─── Search ───────────────────────────────────
+    def search(self, user_id, text="", date_from=None, date_to=None, min_rating=None,
+               temperature_range=None, template=None, limit=50):
+        """Ranked keyword search over one user's history.
+
+        `date_from` / `date_to` are "YYYY-MM-DD" strings (inclusive),
+        `temperature_range` a (low, high) pair. Without `text` the newest
+        matching entries come first. Returns dicts with key, timestamp,
+        rating, temperature, template, is_chain and a highlighted snippet.
+        """
+        if not self.enabled:
+            return []
+        where = ["e.user_id = ?"]
+        params = [user_id]
+        if date_from:
+            where.append("e.day >= ?")
+            params.append(str(date_from))
+        if date_to:
+            where.append("e.day <= ?")
+            params.append(str(date_to))
+        if min_rating:
+            where.append("e.rating >= ?")
+            params.append(min_rating)
+        if temperature_range:
+            where.append("e.temperature BETWEEN ? AND ?")
+            params.extend(temperature_range)
+        if template:
+            where.append("e.template = ?")
+            params.append(template)
+
+        query = _fts_query(text or "")
+        if query:
+            weights = ", ".join(str(w) for w in _FTS_WEIGHTS)
+            sql = (
+                "SELECT e.key, e.timestamp, e.rating, e.temperature, e.template, e.is_chain, "
+                "snippet(entries_fts, -1, '**', '**', '…', 16) "
+                "FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid "
+                f"WHERE entries_fts MATCH ? AND {' AND '.join(where)} "
+                f"ORDER BY bm25(entries_fts, {weights}) LIMIT ?"
+            )
+            params = [query] + params + [limit]
+        else:
+            sql = (
+                "SELECT e.key, e.timestamp, e.rating, e.temperature, e.template, e.is_chain, e.preview "
+                f"FROM entries e WHERE {' AND '.join(where)} ORDER BY e.key DESC LIMIT ?"
+            )
+            params.append(limit)
+
+        try:
+            with self._lock:
+                rows = self._conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print("[History Search] Search failed:", e)
+            return []
+        fields = ("key", "timestamp", "rating", "temperature", "template", "is_chain", "snippet")
+        return [dict(zip(fields, row)) for row in rows]
+
+    def templates(self, user_id):
+        if not self.enabled:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT template FROM entries WHERE user_id = ? AND template IS NOT NULL ORDER BY template",
+                (user_id,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+history_index = HistoryIndex(SEARCH_DB_PATH)
+#history_search
@@ -0,0 +1,194 @@
+import metrics
+from blob_store import has_blob_refs, referenced_blobs
+from firebase_auth import get_db, log_writer, log_summary, blob_store
+from history_search import history_index
+from rollups import removal_updates
+
+PAGE_SIZE = 20
+BACKFILL_BATCH = 200
+BLOB_SCAN_BATCH = 500
+MAX_OPEN_BODIES = 10
+
+# Firebase push keys sort chronologically, so ordering by key is ordering by time.
+# Lists are built from `log_summaries/<user>` (timestamp, preview, rating,
+# step count); the full `logs/<user>/<key>` body is only fetched when opened.
+
+def _items(result):
+    return [(item.key(), item.val()) for item in (result.each() or [])]
+
+def fetch_history_page(user_id, page_size=PAGE_SIZE, before_key=None):
+    """Fetch one page of log summaries, newest first.
+
+    Returns (entries, next_cursor) where entries is a list of (key, summary)
+    and next_cursor is the key to pass as `before_key` for the next page,
+    or None when there is nothing older.
+    """
+    query = get_db().child("log_summaries").child(user_id).order_by_key()
+    if before_key:
+        query = query.end_at(before_key)
+    # One extra row tells us whether another page exists; end_at is inclusive
+    limit = page_size + 1 + (1 if before_key else 0)
+    with metrics.timed("history_page"):
+        items = [(k, v) for k, v in _items(query.limit_to_last(limit).get()) if k != before_key]
+
+    items.reverse()
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    next_cursor = items[-1][0] if has_more and items else None
+    return items, next_cursor
+
+def fetch_newer_than(user_id, after_key):
+    """Fetch only the summaries of logs written after `after_key`, newest first."""
+    with metrics.timed("history_newer"):
+        result = get_db().child("log_summaries").child(user_id).order_by_key().start_at(after_key).get()
+    items = [(k, v) for k, v in _items(result) if k != after_key]
+    items.reverse()
+    return items
+
+def fetch_entry(user_id, key):
+    """Download a single full log entry (an opened row or a search hit)."""
+    with metrics.timed("history_entry"):
+        return blob_store.hydrate(user_id, get_db().child("logs").child(user_id).child(key).get().val())
+
+def backfill_summaries(user_id, batch=BACKFILL_BATCH):
+    """Write summaries for logs created before summaries existed.
+
+    Runs once per user: the logs are read `batch` at a time and a marker
+    under `log_summary_backfill/<user>` stops it from running again.
+    Returns how many summaries were written.
+    """
+    if get_db().child("log_summary_backfill").child(user_id).get().val():
+        return 0
+    written = 0
+    last_key = None
+    while True:
+        query = get_db().child("logs").child(user_id).order_by_key()
+        if last_key:
+            query = query.start_at(last_key)
+        items = [(k, v) for k, v in _items(query.limit_to_first(batch + 1).get()) if k != last_key]
+        if not items:
+            break
+        # Logs with blob references were written together with their summary
+        summaries = {key: log_summary(entry) for key, entry in items if isinstance(entry, dict) and not has_blob_refs(entry)}
+        if summaries:
+            get_db().child("log_summaries").child(user_id).update(summaries)
+        written += len(summaries)
+        last_key = items[-1][0]
+        if len(items) < batch:
+            break
+    get_db().child("log_summary_backfill").child(user_id).set(True)
+    return written
+
+# ─── Session view: what the user has loaded so far ──────────────
+
+def new_history_view():
+    return {"entries": [], "cursor": None, "newest_key": None, "loaded": False, "page": 0, "bodies": {}}
+
+def load_first_page(view, user_id, page_size=PAGE_SIZE):
+    backfill_summaries(user_id)
+    entries, cursor = fetch_history_page(user_id, page_size)
+    view["entries"] = entries
+    view["cursor"] = cursor
+    view["newest_key"] = entries[0][0] if entries else None
+    view["loaded"] = True
+    view["page"] = 0
+
+def load_more(view, user_id, page_size=PAGE_SIZE):
+    if not view["cursor"]:
+        return
+    entries, cursor = fetch_history_page(user_id, page_size, before_key=view["cursor"])
+    seen = {key for key, _ in view["entries"]}
+    view["entries"].extend((k, v) for k, v in entries if k not in seen)
+    view["cursor"] = cursor
+
+def sync_new(view, user_id):
+    """Prepend logs written since the last fetch instead of reloading everything."""
+    if not view["loaded"] or not view["newest_key"]:
+        load_first_page(view, user_id)
+        return
+    newer = fetch_newer_than(user_id, view["newest_key"])
+    if newer:
+        view["entries"] = newer + view["entries"]
+        view["newest_key"] = newer[0][0]
+
+def page_entries(view, page_size=PAGE_SIZE):
+    """The (key, summary) rows of the page being shown; only these are rendered."""
+    start = view["page"] * page_size
+    return view["entries"][start:start + page_size]
+
+def has_older_page(view, page_size=PAGE_SIZE):
+    return (view["page"] + 1) * page_size < len(view["entries"]) or bool(view["cursor"])
+
+def older_page(view, user_id, page_size=PAGE_SIZE):
+    # Fill the next page completely while older entries remain in Firebase
+    while (view["page"] + 2) * page_size > len(view["entries"]) and view["cursor"]:
+        load_more(view, user_id, page_size)
+    if (view["page"] + 1) * page_size < len(view["entries"]):
+        view["page"] += 1
+
+def newer_page(view):
+    view["page"] = max(0, view["page"] - 1)
+
+def open_entry(view, user_id, key):
+    """Full body of one entry, downloaded on first open and kept for a few opens."""
+    bodies = view["bodies"]
+    if key not in bodies:
+        if len(bodies) >= MAX_OPEN_BODIES:
+            bodies.pop(next(iter(bodies)))
+        bodies[key] = fetch_entry(user_id, key) or {}
+    return bodies[key]
+
+def set_summary_rating(view, key, rating):
+    # Keep the loaded row in step with a rating given after it was fetched
+    for entry_key, summary in view["entries"]:
+        if entry_key == key:
+            summary["rating"] = rating
+
+def _blobs_in_use(user_id, hashes):
+    """Which of `hashes` some log of the user still refers to (pages over the stored refs)."""
+    in_use = set()
+    last_key = None
+    while hashes - in_use:
+        query = get_db().child("logs").child(user_id).order_by_key()
+        if last_key:
+            query = query.start_at(last_key)
+        items = [(k, v) for k, v in _items(query.limit_to_first(BLOB_SCAN_BATCH + 1).get()) if k != last_key]
+        for _, entry in items:
+            in_use |= referenced_blobs(entry) & hashes
+        if len(items) < BLOB_SCAN_BATCH:
+            break
+        last_key = items[-1][0]
+    return in_use
+
+def _delete_orphaned_blobs(user_id, hashes):
+    # Bodies are shared between logs, so only the ones nothing else refers to go
+    orphaned = hashes - _blobs_in_use(user_id, hashes)
+    if orphaned:
+        get_db().update({f"blobs/{user_id}/{body_hash}": None for body_hash in orphaned})
+        blob_store.forget(user_id, orphaned)
+    return orphaned
+
+def delete_entry(view, user_id, key):
+    summary = dict(view["entries"]).get(key) or {}
+    # Queued logs must land first: one of them may share this entry's bodies
+    flushed = log_writer.flush(5)
+    hashes = referenced_blobs(get_db().child("logs").child(user_id).child(key).get().val()) if flushed else set()
+    # Before the discards: a still-queued summary write decides what the log counts towards
+    rollup_removal = removal_updates(user_id, key, summary)
+    log_writer.discard(f"logs/{user_id}/{key}")
+    log_writer.discard(f"log_summaries/{user_id}/{key}")
+    log_writer.enqueue(rollup_removal)
+    history_index.remove(user_id, key)
+    get_db().child("logs").child(user_id).child(key).remove()
+    get_db().child("log_summaries").child(user_id).child(key).remove()
+    if hashes:
+        try:
+            _delete_orphaned_blobs(user_id, hashes)
+        except Exception as e:
+            print("[History] Could not delete the entry's stored bodies:", e)
+    view["entries"] = [(k, v) for k, v in view["entries"] if k != key]
+    view["bodies"].pop(key, None)
+    if view["newest_key"] == key:
+        view["newest_key"] = view["entries"][0][0] if view["entries"] else None
+    view["page"] = min(view["page"], max(0, (len(view["entries"]) - 1) // PAGE_SIZE))
+#history_store
@@ -0,0 +1,157 @@
+import threading
+import time
+
+from startup_timing import timed
+
+from config import (
+    LLM_PROVIDER, LLM_MODEL, LLM_TIMEOUT, LLM_MAX_CONNECTIONS,
+    COHERE_API_KEY, OPENAI_API_KEY, STUB_LATENCY_MS, STUB_TOKEN_LATENCY_MS,
+)
+
+DEFAULT_MODELS = {
+    "cohere": "command-a-03-2025",
+    "openai": "gpt-4o-mini",
+    "stub": "echo",
+}
+
+def _pooled_http_client(timeout, max_connections):
+    # One keep-alive pool per provider instead of a new connection per call
+    import httpx
+    return httpx.Client(
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+    )
+
+
+class CohereProvider:
+    name = "cohere"
+
+    def __init__(self, model, timeout=LLM_TIMEOUT, max_connections=LLM_MAX_CONNECTIONS, client=None):
+        self.model = model
+        if client is None:
+            import cohere
+            client = cohere.Client(
+                COHERE_API_KEY,
+                timeout=timeout,
+                httpx_client=_pooled_http_client(timeout, max_connections),
+            )
+        self.client = client
+
+    def chat(self, prompt_text, temperature, max_tokens):
+        response = self.client.chat(
+            message=prompt_text,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            model=self.model,
+            stop_sequences=[]
+        )
+        return response.text
+
+    def chat_stream(self, prompt_text, temperature, max_tokens):
+        stream = self.client.chat_stream(
+            message=prompt_text,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            model=self.model,
+            stop_sequences=[]
+        )
+        for event in stream:
+            if event.event_type == "text-generation" and event.text:
+                yield event.text
+
+
+class OpenAIProvider:
+    name = "openai"
+
+    def __init__(self, model, timeout, max_connections):
+        import openai
+        self.model = model
+        self.client = openai.OpenAI(
+            api_key=OPENAI_API_KEY,
+            timeout=timeout,
+            http_client=_pooled_http_client(timeout, max_connections),
+        )
+
+    def chat(self, prompt_text, temperature, max_tokens):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt_text}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        return response.choices[0].message.content or ""
+
+    def chat_stream(self, prompt_text, temperature, max_tokens):
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt_text}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class StubProvider:
+    """Offline provider for load tests and benchmarks.
+
+    Echoes the prompt back (capped at max_tokens words) after a configurable
+    fixed latency plus a per-token latency. No network, no cost, same output
+    for the same input.
+    """
+    name = "stub"
+
+    def __init__(self, model, latency_ms=0, token_latency_ms=0):
+        self.model = model
+        self.latency = latency_ms / 1000.0
+        self.token_latency = token_latency_ms / 1000.0
+
+    def _tokens(self, prompt_text, max_tokens):
+        words = prompt_text.split()[:max_tokens]
+        return ["Echo:"] + [" " + word for word in words]
+
+    def chat(self, prompt_text, temperature, max_tokens):
+        tokens = self._tokens(prompt_text, max_tokens)
+        time.sleep(self.latency + self.token_latency * len(tokens))
+        return "".join(tokens)
+
+    def chat_stream(self, prompt_text, temperature, max_tokens):
+        time.sleep(self.latency)
+        for token in self._tokens(prompt_text, max_tokens):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield token
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+def create_provider(name, model=None):
+    model = model or DEFAULT_MODELS.get(name)
+    if name == "cohere":
+        return CohereProvider(model, LLM_TIMEOUT, LLM_MAX_CONNECTIONS)
+    if name == "openai":
+        return OpenAIProvider(model, LLM_TIMEOUT, LLM_MAX_CONNECTIONS)
+    if name == "stub":
+        return StubProvider(model, STUB_LATENCY_MS, STUB_TOKEN_LATENCY_MS)
+    raise ValueError(f"Unknown LLM provider '{name}'. Use one of: {', '.join(DEFAULT_MODELS)}")
+
+def get_provider(name=None, model=None):
+    """Return the shared provider instance (created on first use)."""
+    name = (name or LLM_PROVIDER).lower()
+    if not model:
+        model = (LLM_MODEL if name == LLM_PROVIDER.lower() else "") or DEFAULT_MODELS.get(name)
+    with _providers_lock:
+        if (name, model) not in _providers:
+            with timed(f"{name} client init"):
+                _providers[(name, model)] = create_provider(name, model)
+        return _providers[(name, model)]
+
+def set_provider(provider):
+    """Make `provider` the default (used by benchmarks and tests with fakes)."""
+    name = LLM_PROVIDER.lower()
+    with _providers_lock:
+        _providers[(name, LLM_MODEL or DEFAULT_MODELS.get(name))] = provider
+#llm_providers
\ No newline at end of file
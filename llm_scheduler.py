@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from config import LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE
+from resilience import DeadlineExceeded, as_deadline
+
+# Lower number = served first
+PRIORITY_INTERACTIVE = 0   # single prompts a user is waiting on
+PRIORITY_CHAIN = 1         # chain steps
+PRIORITY_BULK = 2          # batch jobs
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_CHAIN: "chain", PRIORITY_BULK: "bulk"}
+
+
+class TokenBucket:
+    """Refills at `per_minute / 60` per second up to `capacity`; 0 per minute = unlimited."""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or max(1, per_minute // 6)
+        self.level = float(self.capacity)
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self):
+        return self.rate <= 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)  # a huge request must not wait forever
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        if not self.unlimited:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+
+    def refund(self, amount):
+        if not self.unlimited and amount > 0:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+
+class Ticket:
+    __slots__ = ("user_id", "priority", "tokens", "enqueued", "waited", "actual_tokens")
+
+    def __init__(self, user_id, priority, tokens):
+        self.user_id = user_id
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.waited = 0.0
+        self.actual_tokens = None
+
+
+class LLMScheduler:
+    """Admits upstream LLM calls from every session of this process.
+
+    Calls pass two token buckets, requests/minute and tokens/minute. While
+    they wait, the highest priority class goes first. Within a class, users
+    take turns, so one user's long chain or batch can't starve the others.
+    A user's own calls keep their order.
+    """
+
+    def __init__(self, requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._queues = {p: OrderedDict() for p in PRIORITY_NAMES}  # priority -> user -> deque of tickets
+        self._cond = threading.Condition()
+        self._waits = deque(maxlen=500)
+        self.granted = 0
+        self.timed_out = 0
+
+    def _next_ticket(self):
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            if users:
+                return next(iter(users.values()))[0]
+        return None
+
+    def _dequeue(self, ticket, served):
+        users = self._queues[ticket.priority]
+        queue = users[ticket.user_id]
+        queue.remove(ticket)
+        if not queue:
+            del users[ticket.user_id]
+        elif served:
+            users.move_to_end(ticket.user_id)  # back of the line: the next user gets a turn
+
+    def acquire(self, user_id=None, priority=PRIORITY_INTERACTIVE, tokens=0, deadline=None):
+        """Block until this call may go upstream; returns its Ticket.
+
+        Raises DeadlineExceeded if `deadline` passes while waiting.
+        """
+        deadline = as_deadline(deadline)
+        ticket = Ticket(user_id or "anonymous", priority, tokens)
+        with self._cond:
+            self._queues[priority].setdefault(ticket.user_id, deque()).append(ticket)
+            while True:
+                if self._next_ticket() is ticket:
+                    wait_for = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                    if wait_for == 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        self._dequeue(ticket, served=True)
+                        ticket.waited = time.monotonic() - ticket.enqueued
+                        self._waits.append((priority, ticket.waited))
+                        self.granted += 1
+                        self._cond.notify_all()
+                        return ticket
+                else:
+                    wait_for = None
+
+                remaining = deadline.remaining() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    self._dequeue(ticket, served=False)
+                    self.timed_out += 1
+                    self._cond.notify_all()
+                    raise DeadlineExceeded("Timed out waiting for a generation slot.", transient=True)
+                if remaining is not None:
+                    wait_for = remaining if wait_for is None else min(wait_for, remaining)
+                self._cond.wait(timeout=wait_for)
+
+    def try_acquire(self, user_id=None, priority=PRIORITY_INTERACTIVE, tokens=0):
+        """A Ticket if the call may go upstream right now, else None (nobody waiting is overtaken)."""
+        ticket = Ticket(user_id or "anonymous", priority, tokens)
+        with self._cond:
+            if self._next_ticket() is not None or max(self.requests.wait_time(1), self.tokens.wait_time(tokens)) > 0:
+                return None
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self._waits.append((priority, 0.0))
+            self.granted += 1
+            return ticket
+
+    def settle(self, ticket, used_tokens=None):
+        """Give back the unused part of the token estimate once the call is done."""
+        if used_tokens is None or used_tokens >= ticket.tokens:
+            return
+        with self._cond:
+            self.tokens.refund(ticket.tokens - used_tokens)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, user_id=None, priority=PRIORITY_INTERACTIVE, tokens=0, deadline=None):
+        ticket = self.acquire(user_id, priority, tokens, deadline)
+        try:
+            yield ticket
+        finally:
+            self.settle(ticket, ticket.actual_tokens)
+
+    def stats(self):
+        with self._cond:
+            depth = {PRIORITY_NAMES[p]: sum(len(q) for q in users.values()) for p, users in self._queues.items()}
+            waiting_users = len({user for users in self._queues.values() for user in users})
+            waits = {}
+            for priority, waited in self._waits:
+                waits.setdefault(PRIORITY_NAMES[priority], []).append(waited)
+            self.requests._refill()
+            self.tokens._refill()
+            report = {
+                "queue_depth": depth,
+                "waiting_users": waiting_users,
+                "granted": self.granted,
+                "timed_out": self.timed_out,
+                "requests_available": None if self.requests.unlimited else int(self.requests.level),
+                "tokens_available": None if self.tokens.unlimited else int(self.tokens.level),
+            }
+        report["wait_ms"] = {
+            name: {
+                "p50": round(sorted(values)[len(values) // 2] * 1000, 1),
+                "p95": round(sorted(values)[max(0, int(len(values) * 0.95) - 1)] * 1000, 1),
+                "max": round(max(values) * 1000, 1),
+            }
+            for name, values in waits.items()
+        }
+        return report
+
+
+llm_scheduler = LLMScheduler()
+#llm_scheduler
@@ -0,0 +1,250 @@
+import atexit
+import copy
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+_last_push = {"time": 0, "random": [0] * 12}
+_push_lock = threading.Lock()
+
+def generate_push_key():
+    """Client-side Firebase push id: 8 time chars + 12 random chars.
+
+    Keys sort chronologically like server-generated push keys, so ordering
+    history by key keeps working.
+    """
+    with _push_lock:
+        now = int(time.time() * 1000)
+        if now == _last_push["time"]:
+            # Same millisecond: increment the random part to keep keys ordered
+            rand = _last_push["random"]
+            for i in range(11, -1, -1):
+                if rand[i] < 63:
+                    rand[i] += 1
+                    break
+                rand[i] = 0
+        else:
+            _last_push["random"] = [random.randrange(64) for _ in range(12)]
+        _last_push["time"] = now
+
+        time_chars = []
+        for _ in range(8):
+            time_chars.append(PUSH_CHARS[now % 64])
+            now //= 64
+        return "".join(reversed(time_chars)) + "".join(PUSH_CHARS[i] for i in _last_push["random"])
+
+
+def increment(amount):
+    """Server-side `+= amount` for a multi-path update value."""
+    return {".sv": {"increment": amount}}
+
+
+def _increment_of(value):
+    if isinstance(value, dict) and isinstance(value.get(".sv"), dict) and "increment" in value[".sv"]:
+        return value[".sv"]["increment"]
+    return None
+
+
+def _combine(old, new):
+    # Two queued increments of one path add up; any other write replaces
+    if _increment_of(old) is not None and _increment_of(new) is not None:
+        return increment(_increment_of(old) + _increment_of(new))
+    return new
+
+
+def _overlaps(path, other):
+    return path == other or path.startswith(other + "/") or other.startswith(path + "/")
+
+
+def _merge_update(pending, path, value):
+    # Firebase rejects multi-path updates where one path contains another,
+    # so child writes are folded into a pending parent and vice versa.
+    parts = path.split("/")
+    for depth in range(len(parts) - 1, 0, -1):
+        parent = "/".join(parts[:depth])
+        if parent in pending and isinstance(pending[parent], dict):
+            node = pending[parent]
+            for part in parts[depth:-1]:
+                node = node.setdefault(part, {})
+            node[parts[-1]] = _combine(node.get(parts[-1]), value)
+            return
+    for other in [p for p in pending if p.startswith(path + "/")]:
+        del pending[other]
+    pending[path] = _combine(pending.get(path), value)
+
+
+class LogWriter:
+    """Background writer that batches Firebase writes into multi-path updates.
+
+    Writes are queued with enqueue() and return immediately. Every enqueue
+    and discard is appended to a local spool journal, so anything not yet
+    sent survives a restart and is retried with exponential backoff. The
+    journal is rewritten with just the unsent writes after each batch that
+    lands (or emptied when nothing is left).
+    """
+
+    def __init__(self, send, spool_path=None, batch_delay=0.2, max_batch=100, max_backoff=60):
+        self.send = send
+        self.spool_path = spool_path
+        self.batch_delay = batch_delay
+        self.max_batch = max_batch
+        self.max_backoff = max_backoff
+        self._pending = OrderedDict()
+        self._inflight = OrderedDict()
+        self._cond = threading.Condition()
+        self._load_spool()
+        self._thread = threading.Thread(target=self._run, name="firebase-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush, 5)
+
+    # ─── Spool ────────────────────────────────────
+    # One JSON record per line: {"updates": {path: value}} or {"discard": path}
+    def _load_spool(self):
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return
+        try:
+            with open(self.spool_path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError as e:
+            print("[Log Writer] Could not read spool:", e)
+            return
+        if text.lstrip().startswith("["):
+            # Spool written by an older version: one JSON list of [path, value]
+            try:
+                records = [{"updates": dict(json.loads(text))}]
+            except ValueError as e:
+                print("[Log Writer] Could not read spool:", e)
+                return
+        else:
+            records = []
+            for line in text.splitlines():
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass  # a line cut short by a crash mid-append
+        for record in records:
+            if "discard" in record:
+                self._drop_pending(record["discard"])
+            for path, value in (record.get("updates") or {}).items():
+                _merge_update(self._pending, path, value)
+        if self._pending:
+            print(f"[Log Writer] Resuming {len(self._pending)} spooled write(s)")
+
+    def _append_spool(self, record):
+        # Caller holds self._cond
+        if not self.spool_path:
+            return
+        try:
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print("[Log Writer] Could not write spool:", e)
+
+    def _compact_spool(self):
+        # Caller holds self._cond; keeps only what is still unsent
+        if not self.spool_path:
+            return
+        try:
+            if not (self._inflight or self._pending):
+                if os.path.exists(self.spool_path):
+                    os.remove(self.spool_path)
+                return
+            tmp_path = self.spool_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"updates": {**self._inflight, **self._pending}}, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.spool_path)
+        except OSError as e:
+            print("[Log Writer] Could not write spool:", e)
+
+    def _drop_pending(self, path):
+        for other in [p for p in self._pending if p == path or p.startswith(path + "/")]:
+            del self._pending[other]
+
+    # ─── Public API ───────────────────────────────
+    def enqueue(self, updates):
+        """Queue {path: value} writes, e.g. {"logs/<uid>/<key>": {...}}."""
+        updates = {path.strip("/"): copy.deepcopy(value) for path, value in updates.items()}
+        with self._cond:
+            for path, value in updates.items():
+                _merge_update(self._pending, path, value)
+            self._append_spool({"updates": updates})
+            self._cond.notify_all()
+
+    def discard(self, path):
+        """Drop queued writes at or below `path` (e.g. a log deleted before it was sent).
+
+        If a batch being sent right now writes there, a delete of `path` is
+        queued behind it, so the batch cannot bring the data back.
+        """
+        path = path.strip("/")
+        with self._cond:
+            self._drop_pending(path)
+            self._append_spool({"discard": path})
+            if any(_overlaps(p, path) for p in self._inflight):
+                _merge_update(self._pending, path, None)
+                self._append_spool({"updates": {path: None}})
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written (or timeout)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pending or self._inflight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def is_pending(self, path):
+        """Whether a queued or in-flight write touches `path` (at, above or below it)."""
+        path = path.strip("/")
+        with self._cond:
+            return any(_overlaps(p, path) for p in list(self._pending) + list(self._inflight))
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending) + len(self._inflight)
+
+    # ─── Worker ───────────────────────────────────
+    def _run(self):
+        attempt = 0
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            time.sleep(self.batch_delay)  # let a burst of writes coalesce
+
+            with self._cond:
+                for _ in range(min(self.max_batch, len(self._pending))):
+                    path, value = self._pending.popitem(last=False)
+                    self._inflight[path] = value
+                batch = dict(self._inflight)
+            if not batch:
+                continue
+
+            try:
+                self.send(batch)
+                attempt = 0
+                with self._cond:
+                    self._inflight.clear()
+                    self._compact_spool()
+                    self._cond.notify_all()
+            except Exception as e:
+                attempt += 1
+                delay = min(self.max_backoff, 2 ** attempt) * random.uniform(0.5, 1.0)
+                print(f"[Log Writer] Write failed ({e}); retrying in {delay:.1f}s")
+                with self._cond:
+                    # Put the batch back in front; newer queued writes win
+                    retry = OrderedDict()
+                    for path, value in list(self._inflight.items()) + list(self._pending.items()):
+                        _merge_update(retry, path, value)
+                    self._pending = retry
+                    self._inflight.clear()
+                time.sleep(delay)
+#log_writer
\ No newline at end of file
@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import METRICS_PORT, METRICS_JSONL_PATH, METRICS_FLUSH_SECONDS
+
+# 📈 Process-wide latency histograms per operation, plus plain counters.
+# Histograms keep Prometheus-style cumulative buckets for export and the most
+# recent samples for p50/p95/p99 in the admin panel.
+PREFIX = "autoprompt"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RECENT_SAMPLES = 1024
+
+_ops = {}        # op -> {"buckets": [...], "sum", "count", "errors", "recent": deque}
+_counters = {}   # (name, sorted label items) -> value
+_lock = threading.Lock()
+_exporters = {"started": False}
+
+
+def observe(op, seconds, error=False):
+    with _lock:
+        stats = _ops.get(op)
+        if stats is None:
+            stats = _ops[op] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0, "errors": 0,
+                                "recent": deque(maxlen=RECENT_SAMPLES)}
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                stats["buckets"][i] += 1
+        stats["sum"] += seconds
+        stats["count"] += 1
+        stats["errors"] += 1 if error else 0
+        stats["recent"].append(seconds)
+
+
+@contextmanager
+def timed(op):
+    """Record how long the block took under `op`; an exception counts as an error."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        observe(op, time.perf_counter() - start, error=True)
+        raise
+    observe(op, time.perf_counter() - start)
+
+
+def inc(name, amount=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+def snapshot():
+    """Per-operation count, error rate and p50/p95/p99 (ms), plus all counters."""
+    with _lock:
+        ops = {op: (stats["count"], stats["errors"], sorted(stats["recent"])) for op, stats in _ops.items()}
+        counters = dict(_counters)
+    rows = []
+    for op, (count, errors, ordered) in sorted(ops.items()):
+        rows.append({
+            "op": op,
+            "count": count,
+            "error_rate": round(errors / count, 4) if count else 0.0,
+            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 1) if ordered else None,
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 1) if ordered else None,
+            "p99_ms": round(_percentile(ordered, 0.99) * 1000, 1) if ordered else None,
+        })
+    return {
+        "ops": rows,
+        "counters": [{"name": name, **dict(labels), "value": value} for (name, labels), value in sorted(counters.items())],
+    }
+
+
+def _labels(items):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}" if items else ""
+
+
+def render_prometheus():
+    """The metrics in Prometheus text exposition format."""
+    with _lock:
+        ops = {op: (list(stats["buckets"]), stats["sum"], stats["count"], stats["errors"]) for op, stats in _ops.items()}
+        counters = dict(_counters)
+
+    lines = [f"# TYPE {PREFIX}_op_seconds histogram"]
+    for op, (buckets, total, count, _) in sorted(ops.items()):
+        for bound, value in zip(BUCKETS, buckets):
+            lines.append(f'{PREFIX}_op_seconds_bucket{{op="{op}",le="{bound}"}} {value}')
+        lines.append(f'{PREFIX}_op_seconds_bucket{{op="{op}",le="+Inf"}} {count}')
+        lines.append(f'{PREFIX}_op_seconds_sum{{op="{op}"}} {total}')
+        lines.append(f'{PREFIX}_op_seconds_count{{op="{op}"}} {count}')
+    lines.append(f"# TYPE {PREFIX}_op_errors_total counter")
+    for op, (_, _, _, errors) in sorted(ops.items()):
+        lines.append(f'{PREFIX}_op_errors_total{{op="{op}"}} {errors}')
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {PREFIX}_{name} counter")
+        for (counter, labels), value in sorted(counters.items()):
+            if counter == name:
+                lines.append(f"{PREFIX}_{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ─── Exporters ──────────────────────────────────
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # scrapes every few seconds would flood the console
+
+
+def _write_jsonl(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), **snapshot()}) + "\n")
+        except OSError as e:
+            print("[Metrics] Could not write JSONL snapshot:", e)
+
+
+def start_exporters(port=METRICS_PORT, jsonl_path=METRICS_JSONL_PATH, interval=METRICS_FLUSH_SECONDS):
+    """Serve /metrics on `port` and/or append snapshots to `jsonl_path`; once per process."""
+    with _lock:
+        if _exporters["started"]:
+            return
+        _exporters["started"] = True
+    if port:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            print(f"[Metrics] Prometheus endpoint on :{port}/metrics")
+        except OSError as e:
+            print(f"[Metrics] Could not listen on port {port}:", e)
+    if jsonl_path:
+        threading.Thread(target=_write_jsonl, args=(jsonl_path, interval), name="metrics-jsonl", daemon=True).start()
+#metrics
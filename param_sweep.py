@@ -0,0 +1,91 @@
+import itertools
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import SWEEP_MAX_WORKERS
+from firebase_auth import log_prompt_to_firebase, log_writer
+from llm_scheduler import PRIORITY_CHAIN
+from log_writer import generate_push_key
+from prompt_engine import generate_prompt
+from resilience import GenerationError
+from template_engine import TemplateRenderError
+from template_manager import build_budgeted_prompt
+from token_budget import count_tokens
+
+# 🧪 One set of inputs generated under every combination of template,
+# temperature and max_tokens. Each variant is logged like a normal prompt and
+# tagged with the sweep id; `sweeps/<user>/<sweep_id>` lists the variants.
+
+
+def sweep_variants(template_names, temperatures, max_tokens_values):
+    """Every (template, temperature, max_tokens) combination, numbered from 0."""
+    return [
+        {"variant": i, "template": name, "temperature": temperature, "max_tokens": max_tokens}
+        for i, (name, temperature, max_tokens) in enumerate(
+            itertools.product(template_names, sorted(temperatures), sorted(max_tokens_values))
+        )
+    ]
+
+
+def _run_variant(variant, template, role, audience, tone, intent, few_shot_examples, use_cache, user_id):
+    result = dict(variant, status="ok", prompt="", response="", error="", latency_ms=None,
+                  prompt_tokens=None, response_tokens=None)
+    try:
+        prompt, _ = build_budgeted_prompt(template, role, audience, tone, intent, few_shot_examples)
+    except TemplateRenderError as e:
+        return dict(result, status="error", error=f"Template could not be filled: {e}")
+
+    start = time.perf_counter()
+    try:
+        response = generate_prompt(prompt, temperature=variant["temperature"], max_tokens=variant["max_tokens"],
+                                   use_cache=use_cache, raise_errors=True, user_id=user_id, priority=PRIORITY_CHAIN)
+    except GenerationError as e:
+        return dict(result, status="error", prompt=prompt, error=str(e))
+    return dict(result, prompt=prompt, response=response,
+                latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                prompt_tokens=count_tokens(prompt), response_tokens=count_tokens(response))
+
+
+def run_sweep(templates, variants, role, audience, tone, intent, few_shot_examples=(), use_cache=True,
+              max_workers=SWEEP_MAX_WORKERS, on_result=None, user_id=None, email=None):
+    """Generate every variant concurrently and return (sweep_id, results in variant order).
+
+    `templates` maps template name -> CompiledTemplate (or structure
+    string). At most `max_workers` variants are in flight; they queue at
+    chain priority, behind single prompts. `on_result(result, done, total)` is called from the calling
+    thread as each variant finishes. Successful variants are logged to the
+    user's history when `user_id` is given.
+    """
+    sweep_id = generate_push_key()
+    results = [None] * len(variants)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {
+            pool.submit(_run_variant, variant, templates[variant["template"]], role, audience, tone, intent,
+                        few_shot_examples, use_cache, user_id): i
+            for i, variant in enumerate(variants)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results[futures[future]] = result
+            if user_id and result["status"] == "ok":
+                result["log_key"], _ = log_prompt_to_firebase(email or "", result["prompt"], result["response"], {
+                    "role": role, "audience": audience, "tone": tone, "intent": intent,
+                    "temperature": result["temperature"], "max_tokens": result["max_tokens"],
+                    "template": result["template"], "sweep_id": sweep_id, "latency_ms": result["latency_ms"],
+                }, uid=user_id)
+            if on_result:
+                on_result(result, done, len(variants))
+
+    if user_id:
+        log_writer.enqueue({f"sweeps/{user_id}/{sweep_id}": {
+            "timestamp": datetime.now().isoformat(),
+            "role": role, "audience": audience, "tone": tone, "intent": intent,
+            "variants": [
+                {key: result.get(key) for key in ("template", "temperature", "max_tokens", "status",
+                                                  "latency_ms", "prompt_tokens", "response_tokens", "log_key")}
+                for result in results
+            ],
+        }})
+    return sweep_id, results
+#param_sweep
@@ -1,17 +1,165 @@
-import cohere
-from config import COHERE_API_KEY
+import time
 
-client = cohere.Client(COHERE_API_KEY)
+import metrics
+from config import GENERATION_DEADLINE_SECONDS
+from llm_providers import get_provider
+from llm_scheduler import llm_scheduler, PRIORITY_INTERACTIVE
+from resilience import GenerationError, Deadline, DeadlineExceeded, as_deadline, call_with_resilience
+from response_cache import response_cache, make_cache_key
+from token_budget import count_tokens
 
-def generate_prompt(prompt_text, temperature=0.7, max_tokens=300):
+def _model_id(provider):
+    return f"{provider.name}:{provider.model}"
+
+def _latency_kind(max_tokens):
+    # Completions are bucketed by max_tokens (next power of two) for the hedge p95
+    return f"chat:{1 << max(0, int(max_tokens) - 1).bit_length()}"
+
+class _Admissions:
+    """Scheduler tickets of one generation: one per upstream request (each attempt and each hedge)."""
+
+    def __init__(self, user_id, priority, tokens, deadline):
+        self.user_id = user_id
+        self.priority = priority
+        self.tokens = tokens
+        self.deadline = deadline
+        self.tickets = []
+
+    def __call__(self, wait):
+        if wait:
+            ticket = llm_scheduler.acquire(self.user_id, self.priority, self.tokens, self.deadline)
+        else:
+            ticket = llm_scheduler.try_acquire(self.user_id, self.priority, self.tokens)
+        if ticket is None:
+            return False
+        metrics.observe("llm_queue_wait", ticket.waited)
+        self.tickets.append(ticket)
+        return True
+
+    def settle(self, used_tokens):
+        # Each request is charged what the successful one used; the rest of the estimate goes back
+        for ticket in self.tickets:
+            llm_scheduler.settle(ticket, used_tokens)
+
+def _call_deadline(deadline):
+    # Each call gets GENERATION_DEADLINE_SECONDS, cut short by any outer (chain) deadline
+    return (as_deadline(deadline) or Deadline()).within(GENERATION_DEADLINE_SECONDS)
+
+def generate_prompt(prompt_text, temperature=0.7, max_tokens=300, use_cache=True, deadline=None, raise_errors=False,
+                    user_id=None, priority=PRIORITY_INTERACTIVE):
+    """Generate a response for prompt_text.
+
+    Failures come back as a "❌ Error: ..." string, or are raised as
+    GenerationError when raise_errors=True (what chaining uses to stop).
+    Upstream calls (not cache hits) queue in the shared llm_scheduler as
+    `user_id` at `priority`.
+    """
     try:
-        response = client.chat(
-            message=prompt_text,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            model="command-a-03-2025",
-            stop_sequences=[]
-        )
-        return response.text
+        provider = get_provider()
+        call_deadline = _call_deadline(deadline)
+
+        computed = []
+
+        def compute():
+            computed.append(True)
+            prompt_tokens = count_tokens(prompt_text)
+            # 🚦 Every upstream request (retries and hedges too) takes its own
+            # turn in the shared scheduler
+            admissions = _Admissions(user_id, priority, prompt_tokens + max_tokens, call_deadline)
+            with metrics.timed("llm_generate"):
+                text = call_with_resilience(
+                    lambda: provider.chat(prompt_text, temperature, max_tokens), deadline=call_deadline,
+                    latency_kind=_latency_kind(max_tokens), admit=admissions,
+                )
+            response_tokens = count_tokens(text)
+            admissions.settle(prompt_tokens + response_tokens)
+            metrics.inc("llm_tokens_total", prompt_tokens, kind="prompt")
+            metrics.inc("llm_tokens_total", response_tokens, kind="response")
+            return text
+
+        if not use_cache:
+            return compute()
+
+        # ♻️ Re-submitted prompts (reruns, double clicks) are served from cache
+        key = make_cache_key(prompt_text, temperature, max_tokens, _model_id(provider))
+        text = response_cache.get_or_compute(key, compute)
+        metrics.inc("generate_cache_total", result="miss" if computed else "hit")
+        return text
+    except GenerationError as e:
+        if raise_errors:
+            raise
+        return f"❌ Error: {str(e)}"
     except Exception as e:
+        if raise_errors:
+            raise GenerationError(str(e)) from e
         return f"❌ Error: {str(e)}"
+
+def stream_prompt(prompt_text, temperature=0.7, max_tokens=300, use_cache=True, deadline=None, raise_errors=False,
+                  user_id=None, priority=PRIORITY_INTERACTIVE):
+    """Yield the response text chunk by chunk as the model generates it.
+
+    A cached response is yielded in one piece. The assembled text is cached
+    once the stream completes, so later calls to either API reuse it.
+    Opening the stream is retried on transient errors; once tokens flow, the
+    deadline is checked between chunks. Like generate_prompt, each attempt
+    to open an uncached stream first waits for its turn in the shared
+    llm_scheduler.
+    """
+    chunks = []
+    started = None
+    try:
+        provider = get_provider()
+        call_deadline = _call_deadline(deadline)
+        key = make_cache_key(prompt_text, temperature, max_tokens, _model_id(provider))
+        if use_cache:
+            cached = response_cache.get(key)
+            metrics.inc("generate_cache_total", result="miss" if cached is None else "hit")
+            if cached is not None:
+                yield cached
+                return
+
+        prompt_tokens = count_tokens(prompt_text)
+        admissions = _Admissions(user_id, priority, prompt_tokens + max_tokens, call_deadline)
+
+        def open_stream():
+            nonlocal started
+            if started is None:
+                started = time.perf_counter()  # once admitted; queue wait is reported separately
+            stream = provider.chat_stream(prompt_text, temperature, max_tokens)
+            return stream, next(stream, None)
+
+        # Only time-to-first-token: kept out of the completion latencies hedging uses
+        stream, first = call_with_resilience(open_stream, deadline=call_deadline, hedge=False, admit=admissions)
+        if first is not None:
+            chunks.append(first)
+            yield first
+        for token in stream:
+            if call_deadline.expired():
+                raise DeadlineExceeded("Generation timed out (deadline exceeded).", transient=True)
+            chunks.append(token)
+            yield token
+    except GenerationError as e:
+        if started is not None:
+            metrics.observe("llm_stream", time.perf_counter() - started, error=True)
+        if raise_errors:
+            raise
+        yield f"❌ Error: {str(e)}"
+        return
+    except Exception as e:
+        if started is not None:
+            metrics.observe("llm_stream", time.perf_counter() - started, error=True)
+        if raise_errors:
+            raise GenerationError(str(e)) from e
+        yield f"❌ Error: {str(e)}"
+        return
+
+    if started is not None:
+        metrics.observe("llm_stream", time.perf_counter() - started)
+    if chunks:
+        text = "".join(chunks)
+        response_tokens = count_tokens(text)
+        admissions.settle(prompt_tokens + response_tokens)
+        metrics.inc("llm_tokens_total", prompt_tokens, kind="prompt")
+        metrics.inc("llm_tokens_total", response_tokens, kind="response")
+        response_cache.set(key, text)
+#prompt_engine
\ No newline at end of file
@@ -0,0 +1,126 @@
+import cProfile
+import os
+import threading
+import time
+from collections import deque
+
+from config import PROFILE_RERUNS, PROFILE_SLOW_MS, PROFILE_DIR, PROFILE_HISTORY
+
+# 🐢 Opt-in profiling of Streamlit reruns. app.py calls `mark(section)` as it
+# reaches each part of the page; the time between marks is that section's cost.
+# Reruns slower than PROFILE_SLOW_MS get their cProfile stats written to
+# PROFILE_DIR (open with `python -m pstats` or snakeviz).
+
+_recent = deque(maxlen=PROFILE_HISTORY)   # finished reruns of every session, newest last
+_lock = threading.Lock()
+_profiling = None                         # the RerunProfile running cProfile; one per process
+_profiling_lock = threading.Lock()
+
+
+def is_enabled(query_params=None):
+    """PROFILE_RERUNS=true turns it on for everyone, `?profile=1` for one browser tab."""
+    return PROFILE_RERUNS or (query_params is not None and query_params.get("profile") == "1")
+
+
+class RerunProfile:
+    def __init__(self, label=""):
+        self.label = label
+        self.started = time.perf_counter()
+        self.sections = []            # [name, seconds]
+        self._section_start = self.started
+        self._profiler = None
+        self._thread = threading.current_thread()
+        self.finished = False
+        self._start_profiler()
+
+    def _start_profiler(self):
+        global _profiling
+        with _profiling_lock:
+            if _profiling is not None and not _profiling._thread.is_alive():
+                # Its rerun died on an uncaught exception and the script thread is gone
+                _profiling.finished = True
+                _profiling._stop_profiler()
+            if _profiling is not None:
+                return
+            try:
+                self._profiler = cProfile.Profile()
+                self._profiler.enable()
+                _profiling = self
+            except ValueError:
+                # Another profiler (a debugger, coverage) already owns the hook
+                self._profiler = None
+
+    def _stop_profiler(self):
+        # Caller holds _profiling_lock
+        global _profiling
+        if _profiling is self:
+            self._profiler.disable()
+            _profiling = None
+
+    def mark(self, section):
+        """End the running section and start `section`."""
+        now = time.perf_counter()
+        if self.sections:
+            self.sections[-1][1] = now - self._section_start
+        self.sections.append([section, 0.0])
+        self._section_start = now
+
+    def finish(self, interrupted=False):
+        """Close the last section, store the rerun and dump its profile if it was slow."""
+        if self.finished:
+            return None
+        self.finished = True
+        now = time.perf_counter()
+        if self._profiler is not None:
+            with _profiling_lock:
+                self._stop_profiler()
+        if self.sections:
+            self.sections[-1][1] = now - self._section_start
+        total = now - self.started
+
+        path = None
+        if self._profiler is not None and total * 1000 >= PROFILE_SLOW_MS:
+            path = self._dump(total)
+        record = {
+            "time": time.strftime("%H:%M:%S"),
+            "label": self.label,
+            "total_ms": round(total * 1000, 1),
+            "sections": {name: round(seconds * 1000, 1) for name, seconds in self.sections},
+            "interrupted": interrupted,
+            "profile": path,
+        }
+        with _lock:
+            _recent.append(record)
+        return record
+
+    def _dump(self, total):
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"rerun-{time.strftime('%Y%m%d-%H%M%S')}-{int(total * 1000)}ms.prof")
+            self._profiler.dump_stats(path)
+            return path
+        except OSError as e:
+            print("[Rerun Profiler] Could not write profile:", e)
+            return None
+
+
+def begin(session_state, label=""):
+    """Start profiling this rerun; returns the RerunProfile to `mark` sections on.
+
+    A rerun cut short by `st.rerun()` never reaches its end, so it is closed
+    here, when the rerun it triggered begins.
+    """
+    previous = session_state.get("_rerun_profile")
+    if previous is not None and not previous.finished:
+        previous.finish(interrupted=True)
+    profile = RerunProfile(label)
+    session_state["_rerun_profile"] = profile
+    return profile
+
+
+def slowest(limit=10):
+    """The slowest of the recent reruns, slowest first."""
+    with _lock:
+        records = list(_recent)
+    return sorted(records, key=lambda r: r["total_ms"], reverse=True)[:limit]
+#rerun_profiler
@@ -0,0 +1,175 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from config import (
+    GENERATION_RETRIES, RETRY_BACKOFF_SECONDS, HEDGE_REQUESTS,
+    HEDGE_MIN_DELAY_SECONDS, LLM_CALL_WORKERS,
+)
+
+TRANSIENT_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+TRANSIENT_NAMES = {
+    "TimeoutException", "ConnectError", "ConnectTimeout", "ReadTimeout", "ReadError",
+    "RemoteProtocolError", "APITimeoutError", "APIConnectionError",
+}
+
+
+class GenerationError(Exception):
+    """A generation call that failed for good (after retries / past its deadline)."""
+
+    def __init__(self, message, attempts=1, transient=False):
+        super().__init__(message)
+        self.attempts = attempts
+        self.transient = transient
+
+
+class DeadlineExceeded(GenerationError):
+    pass
+
+
+class Deadline:
+    """Absolute time budget; `None` seconds means no limit."""
+
+    def __init__(self, seconds=None):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self):
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def within(self, seconds):
+        """A deadline that ends after `seconds` or at this one, whichever is sooner."""
+        child = Deadline(seconds)
+        if self.expires_at is not None and (child.expires_at is None or self.expires_at < child.expires_at):
+            child.expires_at = self.expires_at
+        return child
+
+
+def as_deadline(value):
+    if value is None or isinstance(value, Deadline):
+        return value
+    return Deadline(value)
+
+
+def is_transient(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUS
+    return isinstance(exc, (TimeoutError, ConnectionError)) or type(exc).__name__ in TRANSIENT_NAMES
+
+
+class LatencyTracker:
+    """Recent successful latencies of one kind of call, used to pick its hedge delay."""
+
+    def __init__(self, size=200, min_samples=20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def p95(self):
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+
+# One tracker per kind of call (e.g. "chat:512" for completions of up to 512
+# tokens), so short calls don't set the hedge delay for long ones
+_latency_trackers = {}
+_latency_trackers_lock = threading.Lock()
+_call_pool = ThreadPoolExecutor(max_workers=LLM_CALL_WORKERS, thread_name_prefix="llm-call")
+
+
+def latency_tracker(kind):
+    with _latency_trackers_lock:
+        return _latency_trackers.setdefault(kind, LatencyTracker())
+
+
+def _timed_call(fn, tracker):
+    start = time.monotonic()
+    result = fn()
+    if tracker is not None:
+        tracker.add(time.monotonic() - start)
+    return result
+
+
+def _attempt(fn, deadline, hedge, tracker, admit):
+    """One attempt, optionally hedged, bounded by the deadline."""
+    if admit is not None:
+        admit(True)  # in the caller's thread, so queued calls never tie up the call pool
+    hedge_delay = tracker.p95() if hedge and tracker is not None else None
+    if deadline.expires_at is None and hedge_delay is None:
+        return _timed_call(fn, tracker)
+
+    futures = {_call_pool.submit(_timed_call, fn, tracker)}
+    if hedge_delay is not None:
+        hedge_delay = max(HEDGE_MIN_DELAY_SECONDS, hedge_delay)
+        remaining = deadline.remaining()
+        done, _ = wait(futures, timeout=hedge_delay if remaining is None else min(hedge_delay, remaining))
+        if not done and not deadline.expired() and (admit is None or admit(False)):
+            # 🏇 Slow call: fire a second one and take whichever answers first
+            futures.add(_call_pool.submit(_timed_call, fn, tracker))
+
+    error = None
+    while futures:
+        done, futures = wait(futures, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    if error is not None and not futures:
+        raise error
+    raise DeadlineExceeded("Generation timed out (deadline exceeded).", transient=True)
+
+
+def call_with_resilience(fn, deadline=None, retries=GENERATION_RETRIES, hedge=HEDGE_REQUESTS, latency_kind=None,
+                         admit=None):
+    """Run fn() with a deadline, retries on transient errors and optional hedging.
+
+    Successful call times are recorded under `latency_kind`, and a hedge
+    waits for that kind's p95. Without a kind nothing is recorded and the
+    call is never hedged.
+    `admit(wait)` is called before every upstream request, retries and
+    hedges included. With wait=True it blocks until the request may go (or
+    raises DeadlineExceeded); with wait=False it returns whether it may go
+    right now, and a hedge that may not is skipped.
+    Raises GenerationError when the call cannot succeed.
+    """
+    deadline = as_deadline(deadline) or Deadline()
+    tracker = latency_tracker(latency_kind) if latency_kind else None
+    attempt = 0
+    while True:
+        attempt += 1
+        if deadline.expired():
+            raise DeadlineExceeded("Generation timed out (deadline exceeded).", attempts=attempt - 1, transient=True)
+        try:
+            return _attempt(fn, deadline, hedge, tracker, admit)
+        except DeadlineExceeded as e:
+            e.attempts = attempt
+            raise
+        except Exception as e:
+            transient = is_transient(e)
+            if not transient or attempt > retries:
+                raise GenerationError(str(e), attempts=attempt, transient=transient) from e
+            delay = RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            remaining = deadline.remaining()
+            if remaining is not None and delay >= remaining:
+                raise GenerationError(str(e), attempts=attempt, transient=True) from e
+            print(f"[Generation] Transient error ({e}); retry {attempt}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+#resilience
\ No newline at end of file
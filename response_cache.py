@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from config import CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_DB_PATH
+
+
+def make_cache_key(prompt_text, temperature, max_tokens, model):
+    # 🔑 Same prompt + same parameters + same model = same key
+    raw = json.dumps([prompt_text, float(temperature), int(max_tokens), model], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier cache for LLM responses.
+
+    Tier 1 is an in-memory LRU bounded by entry count and TTL.
+    Tier 2 is an optional SQLite file so responses survive restarts.
+    Concurrent misses for the same key share one upstream call (single-flight).
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, db_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._entries = OrderedDict()  # key -> (expires_at, text)
+        self._inflight = {}            # key -> Future
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if db_path:
+            self._init_db()
+
+    # ─── SQLite tier ──────────────────────────────
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        try:
+            folder = os.path.dirname(self.db_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, text TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+        except sqlite3.Error as e:
+            print("[Response Cache] Disabling disk tier:", e)
+            self.db_path = None
+
+    def _disk_get(self, key):
+        if not self.db_path:
+            return None
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT text, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[1] < time.time():
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    return None
+                return row
+        except sqlite3.Error as e:
+            print("[Response Cache] Disk read failed:", e)
+            return None
+
+    def _disk_set(self, key, text, expires_at):
+        if not self.db_path:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, text, expires_at) VALUES (?, ?, ?)",
+                    (key, text, expires_at),
+                )
+        except sqlite3.Error as e:
+            print("[Response Cache] Disk write failed:", e)
+
+    # ─── Memory tier ──────────────────────────────
+    def _memory_set(self, key, text, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                if item[0] >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return item[1]
+                del self._entries[key]
+
+        row = self._disk_get(key)
+        if row is not None:
+            text, expires_at = row
+            self._memory_set(key, text, expires_at)
+            with self._lock:
+                self.hits += 1
+            return text
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, text):
+        expires_at = time.time() + self.ttl_seconds
+        self._memory_set(key, text, expires_at)
+        self._disk_set(key, text, expires_at)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached text for `key`, or run `compute()` once and cache it.
+
+        If another thread is already computing the same key, wait for its
+        result instead of starting a second upstream call. Exceptions are
+        shared with the waiters but never cached.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            text = compute()
+            self.set(key, text)
+            future.set_result(text)
+            return text
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM responses")
+            except sqlite3.Error as e:
+                print("[Response Cache] Disk clear failed:", e)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# 🌐 One cache per process, shared by every Streamlit session
+response_cache = ResponseCache(
+    max_entries=CACHE_MAX_ENTRIES,
+    ttl_seconds=CACHE_TTL_SECONDS,
+    db_path=CACHE_DB_PATH or None,
+)
+#response_cache
\ No newline at end of file
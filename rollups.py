@@ -0,0 +1,157 @@
+import threading
+from collections import OrderedDict
+
+from firebase_auth import get_db, log_writer
+from log_writer import increment
+
+# 📊 Running totals under `rollups/<dimension>/<value>` across all users:
+#   logs, rated, rating_sum, stars/<1..5>   (server-side increments)
+#   value                                   the readable dimension value
+# They are queued in the same multi-path update as the log or rating change
+# they count, so dashboards read a few small nodes instead of every log.
+
+DIMENSIONS = ("template", "tone", "temperature", "max_tokens", "chain_length")
+_RECENT_LOGS = 4096
+_FORBIDDEN_KEY_CHARS = str.maketrans({c: "_" for c in ".$#[]/"})
+
+# log key -> (dims, rating) of this process's latest write for a log. The
+# stored summary is stale while that write is still queued, so only then is
+# this trusted; afterwards the summary wins, since another process may have
+# re-rated the log in the meantime.
+_recent = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+def rollup_dims(entry):
+    """{dimension: readable value} that a log counts towards."""
+    temperature = entry.get("temperature")
+    return {
+        "template": entry.get("template") or "(none)",
+        "tone": entry.get("tone") or "(none)",
+        "temperature": f"{float(temperature):.2f}" if temperature is not None else "(none)",
+        "max_tokens": str(entry.get("max_tokens") or "(none)"),
+        "chain_length": str(len(entry.get("chain") or [])),
+    }
+
+
+def _node(dimension, value):
+    return f"rollups/{dimension}/{str(value).translate(_FORBIDDEN_KEY_CHARS) or '_'}"
+
+
+def _count_rating(changes, dims, rating, sign):
+    # Adds into {path: amount}; a rating taken out and put back cancels out
+    for dimension, value in dims.items():
+        node = _node(dimension, value)
+        for path, amount in ((f"{node}/rated", sign), (f"{node}/rating_sum", sign * rating),
+                             (f"{node}/stars/{rating}", sign)):
+            changes[path] = changes.get(path, 0) + amount
+    return changes
+
+
+def _increments(changes):
+    return {path: increment(amount) for path, amount in changes.items() if amount}
+
+
+def _remember(log_key, dims, rating):
+    with _recent_lock:
+        _recent[log_key] = (dims, rating)
+        _recent.move_to_end(log_key)
+        while len(_recent) > _RECENT_LOGS:
+            _recent.popitem(last=False)
+
+
+def log_updates(log_key, dims, rating=None):
+    """Increments for a newly written log (and its rating, if it came with one)."""
+    updates = {}
+    for dimension, value in dims.items():
+        updates[f"{_node(dimension, value)}/value"] = value
+        updates[f"{_node(dimension, value)}/logs"] = increment(1)
+    if rating:
+        updates.update(_increments(_count_rating({}, dims, rating, 1)))
+    _remember(log_key, dims, rating)
+    return updates
+
+
+def _counted(user_id, log_key, fallback=None):
+    """(dims, rating) that a log currently counts towards, or None if it counts towards nothing.
+
+    `fallback` is the summary to use when this process has a write for the
+    log queued but no longer remembers it.
+    """
+    summary = None
+    if log_writer.is_pending(f"log_summaries/{user_id}/{log_key}"):
+        with _recent_lock:
+            known = _recent.get(log_key)
+        if known is not None:
+            return known
+        summary = fallback
+    if summary is None:
+        summary = get_db().child("log_summaries").child(user_id).child(log_key).get().val() or {}
+    if not summary.get("rollup"):
+        return None
+    return summary["rollup"], summary.get("rating")
+
+
+def rating_updates(user_id, log_key, rating):
+    """Increments that move a log from its previous rating to `rating`.
+
+    The old rating is taken back out, so re-rating never double-counts.
+    Logs written before rollups existed (no `rollup` in their summary) are
+    left out. Two processes re-rating one log at the same moment can still
+    both take out the same old rating; pyrebase has no transactions.
+    """
+    known = _counted(user_id, log_key)
+    if known is None:
+        return {}
+    dims, previous = known
+    if previous == rating:
+        return {}
+    changes = {}
+    if previous:
+        _count_rating(changes, dims, previous, -1)
+    if rating:
+        _count_rating(changes, dims, rating, 1)
+    _remember(log_key, dims, rating)
+    return _increments(changes)
+
+
+def removal_updates(user_id, log_key, summary):
+    """Increments that take a deleted log back out (`summary` is its last known summary)."""
+    known = _counted(user_id, log_key, fallback=summary)
+    with _recent_lock:
+        _recent.pop(log_key, None)
+    if known is None:
+        return {}
+    dims, rating = known
+    updates = {f"{_node(dimension, value)}/logs": increment(-1) for dimension, value in dims.items()}
+    if rating:
+        updates.update(_increments(_count_rating({}, dims, rating, -1)))
+    return updates
+
+
+def _as_dict(node):
+    # Firebase returns maps with mostly small integer keys (chain lengths, stars) as lists
+    if isinstance(node, list):
+        return {str(i): value for i, value in enumerate(node) if value is not None}
+    return node or {}
+
+
+def fetch_rollups():
+    """Every rollup as {dimension: [row, ...]}, one row per value, most logs first."""
+    stored = get_db().child("rollups").get().val() or {}
+    report = {}
+    for dimension in DIMENSIONS:
+        rows = []
+        for node in _as_dict(stored.get(dimension)).values():
+            rated = node.get("rated") or 0
+            stars = _as_dict(node.get("stars"))
+            rows.append({
+                dimension: node.get("value"),
+                "logs": node.get("logs") or 0,
+                "rated": rated,
+                "avg_rating": round((node.get("rating_sum") or 0) / rated, 2) if rated else None,
+                **{"⭐" * star: stars.get(str(star), 0) for star in range(1, 6)},
+            })
+        report[dimension] = sorted(rows, key=lambda row: row["logs"], reverse=True)
+    return report
+#rollups
@@ -0,0 +1,61 @@
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# ⏱️ Process-wide record of how long imports and client setup took. Each
+# label is kept once: app.py reruns its `timed` imports on every interaction,
+# and only the first (cold) run is startup cost.
+_timings = []
+_recorded = set()
+_lock = threading.Lock()
+_process_start = time.perf_counter()
+
+@contextmanager
+def timed(label):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(label, time.perf_counter() - start)
+
+def record(label, seconds):
+    with _lock:
+        if label in _recorded:
+            return
+        _recorded.add(label)
+        _timings.append({"step": label, "ms": round(seconds * 1000, 1)})
+
+def timed_import(module_name):
+    """Import a module and record how long it took (0 if it was already loaded)."""
+    with timed(f"import {module_name}"):
+        return importlib.import_module(module_name)
+
+def report():
+    with _lock:
+        return list(_timings)
+
+def print_report(file=sys.stdout):
+    rows = report()
+    width = max([len(row["step"]) for row in rows] + [4])
+    print(f"{'Step'.ljust(width)}  {'ms':>9}", file=file)
+    for row in rows:
+        print(f"{row['step'].ljust(width)}  {row['ms']:>9.1f}", file=file)
+    total = sum(row["ms"] for row in rows)
+    print(f"{'Total'.ljust(width)}  {total:>9.1f}", file=file)
+
+
+if __name__ == "__main__":
+    # Cold-start breakdown without Streamlit: imports first, then lazy clients.
+    # Go through the importable module so the clients record into the same list.
+    import startup_timing
+    for name in ["config", "prompt_engine", "chaining", "firebase_auth", "template_manager", "history_store"]:
+        startup_timing.timed_import(name)
+
+    import firebase_auth
+    import llm_providers
+    firebase_auth.get_db()
+    llm_providers.get_provider()
+    startup_timing.print_report()
+#startup_timing
\ No newline at end of file
@@ -0,0 +1,90 @@
+import string
+from functools import lru_cache
+
+_formatter = string.Formatter()
+
+
+class TemplateRenderError(ValueError):
+    """The template is malformed or the values don't fit it."""
+
+
+def escape(text):
+    # Make literal text safe to embed in a template structure
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+class CompiledTemplate:
+    """A template `structure` parsed and checked once.
+
+    The plan is a list of (literal_text, placeholder_name_or_None) pairs
+    used for validation and partial rendering. `{{` and `}}` are literal
+    braces, as with str.format.
+    """
+
+    def __init__(self, structure):
+        self.structure = structure
+        self.plan = []
+        names = []
+        try:
+            for literal, field, spec, conversion in _formatter.parse(structure):
+                if field is not None:
+                    if not field.isidentifier():
+                        raise TemplateRenderError(f"Unsupported placeholder '{{{field}}}': use names like {{role}}.")
+                    if spec or conversion:
+                        raise TemplateRenderError(f"Placeholder '{{{field}}}' can't use format specs or conversions.")
+                    if field not in names:
+                        names.append(field)
+                self.plan.append((literal, field))
+        except ValueError as e:
+            if isinstance(e, TemplateRenderError):
+                raise
+            raise TemplateRenderError(f"Malformed template: {e}. Use {{{{ and }}}} for literal braces.") from e
+        self.placeholders = tuple(names)
+        self._required = frozenset(names)
+
+    def missing(self, values):
+        return [name for name in self.placeholders if name not in values]
+
+    def validate(self, values):
+        if not self._required <= values.keys():
+            raise TemplateRenderError(f"Missing values for: {', '.join(self.missing(values))}")
+
+    def render(self, values=None, **kwargs):
+        values = dict(values or {}, **kwargs) if kwargs else (values or {})
+        self.validate(values)
+        # Placeholders were checked at compile time to be plain names, so the
+        # C-level format_map does the join; values are never re-parsed.
+        return self.structure.format_map(values)
+
+    def partial(self, values=None, **kwargs):
+        """Fill some placeholders now and return a template for the rest."""
+        values = dict(values or {}, **kwargs)
+        parts = []
+        for literal, field in self.plan:
+            parts.append(escape(literal))
+            if field is not None:
+                parts.append(escape(str(values[field])) if field in values else "{" + field + "}")
+        return compile_template("".join(parts))
+
+    def render_many(self, rows):
+        """Render many value dicts at once; raises on the first invalid row."""
+        fill = self.structure.format_map
+        rendered = []
+        for row in rows:
+            self.validate(row)
+            rendered.append(fill(row))
+        return rendered
+
+
+@lru_cache(maxsize=512)
+def compile_template(structure):
+    return CompiledTemplate(structure)
+
+
+def render_few_shot(examples):
+    # Assembled with one join instead of repeated +=
+    return "".join(
+        f"Example {idx+1}:\nInput: {ex_input}\nOutput: {ex_output}\n\n"
+        for idx, (ex_input, ex_output) in enumerate(examples)
+    )
+#template_engine
\ No newline at end of file
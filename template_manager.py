@@ -1,25 +1,121 @@
 import json
 import os
-from firebase_auth import db  # 👈 import your db from firebase_auth
+import threading
+from collections import OrderedDict
+import metrics
+from firebase_auth import get_db  # 👈 Firebase is initialised on first use
+from template_engine import CompiledTemplate, compile_template, render_few_shot
+from token_budget import fit_few_shot
+from config import CONTEXT_BUDGET_TOKENS
 
-def load_templates(user_id=None):
-    templates = {}
+TEMPLATE_DIR = "templates"
+MAX_CACHED_USERS = 128
 
-    # 1. 🔍 Load from Firebase if user_id is provided
-    if user_id:
-        try:
-            firebase_templates = db.child("templates").child(user_id).get()
-            if firebase_templates.each():
-                for item in firebase_templates.each():
-                    templates[item.key()] = item.val()
-        except Exception as e:
-            print("Error loading templates from Firebase:", e)
-
-    # 2. 📁 Also load from local directory (optional)
-    for file in os.listdir("templates"):
+# 🗂️ Local templates: cached until a file in templates/ changes
+_local_cache = {"signature": None, "templates": {}}
+# 👤 Firebase templates per user: LRU, dropped when the user saves a template
+_user_cache = OrderedDict()
+_cache_lock = threading.Lock()
+cache_stats = {"local_hits": 0, "local_misses": 0, "user_hits": 0, "user_misses": 0}
+
+def _local_signature():
+    # Directory mtime catches added/removed files, file mtimes catch edits
+    entries = [(TEMPLATE_DIR, os.stat(TEMPLATE_DIR).st_mtime_ns)]
+    for file in sorted(os.listdir(TEMPLATE_DIR)):
+        if file.endswith(".json"):
+            path = os.path.join(TEMPLATE_DIR, file)
+            entries.append((file, os.stat(path).st_mtime_ns))
+    return tuple(entries)
+
+def _load_local_templates():
+    signature = _local_signature()
+    with _cache_lock:
+        if _local_cache["signature"] == signature:
+            cache_stats["local_hits"] += 1
+            return _local_cache["templates"]
+
+    templates = {}
+    for file in os.listdir(TEMPLATE_DIR):
         if file.endswith(".json"):
-            with open(os.path.join("templates", file), "r") as f:
+            with open(os.path.join(TEMPLATE_DIR, file), "r") as f:
                 templates[file.split(".")[0]] = json.load(f)
 
+    with _cache_lock:
+        cache_stats["local_misses"] += 1
+        _local_cache["signature"] = signature
+        _local_cache["templates"] = templates
     return templates
-#template_manager.py
+
+def _load_user_templates(user_id):
+    with _cache_lock:
+        if user_id in _user_cache:
+            _user_cache.move_to_end(user_id)
+            cache_stats["user_hits"] += 1
+            return _user_cache[user_id]
+
+    templates = {}
+    try:
+        firebase_templates = get_db().child("templates").child(user_id).get()
+        if firebase_templates.each():
+            for item in firebase_templates.each():
+                templates[item.key()] = item.val()
+    except Exception as e:
+        print("Error loading templates from Firebase:", e)
+        return templates  # don't cache a failed fetch
+
+    with _cache_lock:
+        cache_stats["user_misses"] += 1
+        _user_cache[user_id] = templates
+        while len(_user_cache) > MAX_CACHED_USERS:
+            _user_cache.popitem(last=False)
+    return templates
+
+def load_templates(user_id=None):
+    templates = {}
+
+    with metrics.timed("load_templates"):
+        # 1. 🔍 Load from Firebase if user_id is provided
+        if user_id:
+            templates.update(_load_user_templates(user_id))
+
+        # 2. 📁 Also load from local directory (optional)
+        templates.update(_load_local_templates())
+
+    return templates
+
+def invalidate_user_templates(user_id):
+    with _cache_lock:
+        _user_cache.pop(user_id, None)
+
+def save_template(user_id, name, template_data):
+    get_db().child("templates").child(user_id).child(name).set(template_data)
+    invalidate_user_templates(user_id)
+
+def get_compiled_template(user_id, name):
+    """The CompiledTemplate of template `name`, or None if there is no such template.
+
+    Compiled templates are cached by structure, so only the first call for a
+    structure parses it. Raises TemplateRenderError for a malformed one.
+    """
+    template = load_templates(user_id).get(name)
+    return None if template is None else compile_template(template.get("structure", ""))
+
+def _compiled(template):
+    # Builders take a CompiledTemplate or a raw structure string
+    return template if isinstance(template, CompiledTemplate) else compile_template(template)
+
+def build_full_prompt(template, role, audience, tone, intent, few_shot_examples=()):
+    # Fill the template, then put any few-shot examples in front of it
+    base_prompt = _compiled(template).render(role=role, audience=audience, tone=tone, intent=intent)
+    return render_few_shot(few_shot_examples) + "Now complete the task:\n" + base_prompt
+
+def build_budgeted_prompt(template, role, audience, tone, intent, few_shot_examples=(), budget=CONTEXT_BUDGET_TOKENS):
+    """build_full_prompt that drops trailing few-shot examples to stay within `budget` tokens.
+
+    `template` is a CompiledTemplate or a structure string.
+    Returns (full_prompt, dropped_example_count).
+    """
+    base_prompt = _compiled(template).render(role=role, audience=audience, tone=tone, intent=intent)
+    kept, dropped = fit_few_shot(few_shot_examples, base_prompt, budget)
+    return render_few_shot(kept) + "Now complete the task:\n" + base_prompt, dropped
+#template_manager.py
\ No newline at end of file
@@ -0,0 +1,60 @@
+import re
+
+from config import CONTEXT_BUDGET_TOKENS, CHAIN_CARRY_MAX_TOKENS
+
+# Offline approximation of a BPE tokenizer: words split into ~6-char pieces,
+# punctuation is one token each. Close enough to budget prompts without a
+# model-specific vocabulary or a network call.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_PIECE = 6
+_MARKER_TOKENS = 8  # "…[N tokens trimmed]…"
+
+def _spans(text):
+    for match in _TOKEN_RE.finditer(text):
+        start, end = match.span()
+        if end - start <= _PIECE:
+            yield start, end
+        else:
+            for piece in range(start, end, _PIECE):
+                yield piece, min(piece + _PIECE, end)
+
+def count_tokens(text):
+    if not text:
+        return 0
+    return sum(1 + (len(word) - 1) // _PIECE for word in _TOKEN_RE.findall(text))
+
+def compact_text(text, max_tokens):
+    """Keep the start and end of `text` within `max_tokens`, marking the cut."""
+    if max_tokens is None or count_tokens(text) <= max_tokens:
+        return text
+    spans = list(_spans(text))
+    keep = max(1, max_tokens - _MARKER_TOKENS)
+    head = max(1, keep * 2 // 3)
+    tail = max(0, keep - head)
+    cut_start = spans[head - 1][1]
+    cut_end = spans[len(spans) - tail][0] if tail else len(text)
+    skipped = len(spans) - head - tail
+    return f"{text[:cut_start]}\n…[{skipped} tokens trimmed]…\n{text[cut_end:]}".rstrip()
+
+def fit_few_shot(examples, base_prompt, budget=CONTEXT_BUDGET_TOKENS):
+    """Drop the lowest-priority examples until the prompt fits the budget.
+
+    Examples are (input, output) pairs in priority order: the last ones are
+    dropped first. Returns (kept_examples, dropped_count).
+    """
+    from template_engine import render_few_shot
+
+    kept = list(examples)
+    base_tokens = count_tokens("Now complete the task:\n" + base_prompt)
+    example_tokens = [count_tokens(render_few_shot([example])) for example in kept]
+    while kept and base_tokens + sum(example_tokens) > budget:
+        kept.pop()
+        example_tokens.pop()
+    return kept, len(examples) - len(kept)
+
+def carry_budget(pieces, budget=CONTEXT_BUDGET_TOKENS, per_piece=CHAIN_CARRY_MAX_TOKENS):
+    # Each carried-over output gets an equal share of the budget, capped per piece
+    if not pieces:
+        return per_piece
+    return max(1, min(per_piece, budget // pieces))
+#token_budget
\ No newline at end of file